@@ -0,0 +1,145 @@
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def _take(tokens, updated, now, rate, burst, cost):
+    # Token bucket: refill at rate per second up to burst, then spend cost if there is enough.
+    # Returns (tokens left, allowed, seconds until cost tokens are available).
+    tokens = min(burst, tokens + max(now - updated, 0) * rate)
+    if tokens >= cost:
+        return tokens - cost, True, 0.0
+    return tokens, False, (cost - tokens) / rate
+
+
+class MemoryBucketStore:
+    # Buckets for this process only. The least recently used keys are dropped beyond max_keys,
+    # which only ever hands a forgotten client a full bucket again.
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, now, cost=1):
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens, allowed, retry_after = _take(tokens, updated, now, rate, burst, cost)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+BUCKETS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+)
+"""
+UPSERT_BUCKET_SQL = (
+    "INSERT INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?) "
+    "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated"
+)
+
+
+class SQLiteBucketStore:
+    # Buckets shared by every worker process that opens the same file, so a client gets one
+    # allowance per deployment rather than one per worker. Wall-clock time, since monotonic
+    # clocks are not comparable between processes.
+    clock = staticmethod(time.time)
+
+    def __init__(self, path, timeout=1.0, prune_every=1000):
+        self.path = path
+        self.timeout = timeout
+        self.prune_every = prune_every
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(BUCKETS_SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit, so take() can open its own BEGIN IMMEDIATE transaction
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.takes = 0
+        return conn
+
+    def take(self, key, rate, burst, now, cost=1):
+        try:
+            conn = self._connect()
+            # IMMEDIATE takes the write lock up front, so two processes can't both spend the same tokens
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT tokens, updated FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+                tokens, updated = row if row else (burst, now)
+                tokens, allowed, retry_after = _take(tokens, updated, now, rate, burst, cost)
+                conn.execute(UPSERT_BUCKET_SQL, (key, tokens, now))
+                self._local.takes += 1
+                if self._local.takes % self.prune_every == 0:
+                    # Buckets idle long enough to have refilled are the same as missing ones
+                    conn.execute("DELETE FROM rate_buckets WHERE updated < ?", (now - burst / rate,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.OperationalError as e:
+            # A stuck or unavailable store must not take the public pages down with it
+            logger.warning("Rate limit store unavailable, admitting request: %s", e)
+            return True, 0.0
+        return allowed, retry_after
+
+
+class RateLimiter:
+    # rate tokens per second per key, up to burst at once; a rate of 0 turns the limiter off
+    def __init__(self, rate, burst, store=None):
+        if rate < 0 or burst < 1:
+            raise ValueError("Rate must not be negative and burst must be at least 1")
+        self.rate = rate
+        self.burst = burst
+        self.store = store or MemoryBucketStore()
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def take(self, key, cost=1):
+        if not self.enabled:
+            return True, 0.0
+        return self.store.take(key, self.rate, self.burst, self.store.clock(), cost)
+
+
+class ConcurrencyLimiter:
+    # Caps requests in flight; try_acquire() never waits, so callers can turn excess load away
+    # at once instead of queueing it. A limit of 0 means unlimited.
+    def __init__(self, limit):
+        self.limit = limit
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if self.limit and self._active >= self.limit:
+                return False
+            self._active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+
+    @property
+    def active(self):
+        return self._active
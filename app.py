@@ -1,30 +1,51 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session
-from flask_wtf import FlaskForm
-from wtforms import StringField, FloatField, SubmitField, SelectField, TextAreaField, PasswordField
-from wtforms.validators import DataRequired, Email, NumberRange
-from wtforms import ValidationError
-from core import DriveSyncApp
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, session, jsonify, stream_with_context, g
+from flask import before_render_template, template_rendered, current_app
+from flask.cli import with_appcontext
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.local import LocalProxy
+from datetime import datetime
+from operator import attrgetter
+import hashlib
+import importlib
+import io
+import json
+import math
+import click
+import os
+import threading
+import time
+import metrics
+from core import DriveSyncApp, BacklogFull
+from storage import SQLiteStorage
+from jobs import JobQueue, QueueFull
+from cache import TTLCache
+from admission import RateLimiter, ConcurrencyLimiter, MemoryBucketStore, SQLiteBucketStore
+from dispatch import COMPATIBLE_VEHICLE_TYPES
+from distance import MAX_ERROR
+from scheduling import local_time
+from pagination import paginate, ChainedSequence
+import importer
+from locations import LOCATIONS, gazetteer
 from models import Vehicle, Driver, Client, ClientRequest
 
-flask_app = Flask(__name__)
-flask_app.config['SECRET_KEY'] = 'your-secret-key'  # Replace in production
-logic = DriveSyncApp()
+# The DriveSyncApp of whichever app create_app() built for the current request or CLI command
+logic = LocalProxy(lambda: current_app.extensions['drivesync'])
 
 ADMIN_CREDENTIALS = {
     'username': 'admin',
     'password': 'admin123'
 }
 
-LOCATIONS = [
-    ('Kampala', (0.3476, 32.5825)),
-    ('Entebbe', (0.3163, 32.3892)),
-    ('Jinja', (0.4244, 33.2041)),
-    ('Gulu', (2.7746, 32.2990)),
-    ('Mbarara', (-0.6072, 30.6545)),
-    ('Fort Portal', (0.6710, 30.2750)),
-    ('Arua', (3.0201, 30.9111)),
-    ('Mbale', (1.0784, 34.1750))
-]
+MAX_BATCH_LANES = 50000
+
+# Views are collected here at import time and attached to each app by create_app()
+VIEWS = []
+
+def route(rule, **options):
+    def decorator(view):
+        VIEWS.append((rule, view, options))
+        return view
+    return decorator
 
 def format_number(value):
     try:
@@ -32,98 +53,165 @@ def format_number(value):
     except (ValueError, TypeError):
         return value
 
-flask_app.jinja_env.filters['format_number'] = format_number
+def place_name(point):
+    # Trip end points are stored as coordinates; show the place they are at when there is one
+    try:
+        return gazetteer().label(point)
+    except (ValueError, TypeError, IndexError):
+        return point
+
+# Endpoint each serving thread is currently handling, so the profiler can sample just one route
+ACTIVE_ENDPOINTS = {}
+PROFILING_ENABLED = os.environ.get('DRIVESYNC_PROFILING', '').lower() in ('1', 'true', 'yes')
+profiler_lock = threading.Lock()
+
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    ACTIVE_ENDPOINTS[threading.get_ident()] = request.endpoint
+
+def record_request_time(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=request.endpoint or 'unmatched',
+                                        method=request.method, status=response.status_code)
+    return response
+
+def forget_active_endpoint(exc):
+    ACTIVE_ENDPOINTS.pop(threading.get_ident(), None)
+
+def start_template_timer(sender, template, context, **extra):
+    g.setdefault('template_started', []).append(time.perf_counter())
+
+def record_template_time(sender, template, context, **extra):
+    started = g.get('template_started')
+    if started:
+        metrics.TEMPLATE_SECONDS.observe(time.perf_counter() - started.pop(), template=template.name)
+
+def collect_gauges():
+    QUEUE_PENDING.set(logic.jobs.pending if logic.jobs else 0)
+    STORED_RECORDS.set(len(logic.trips), kind='trips')
+    STORED_RECORDS.set(len(logic.client_requests), kind='client_requests')
+    STORED_RECORDS.set(len(logic.clients), kind='clients')
+    STORED_RECORDS.set(len(logic.drivers), kind='drivers')
+    DISTANCE_CACHE_ENTRIES.set(logic.distances.stats()['cache_size'], use='trip')
+    DISTANCE_CACHE_ENTRIES.set(logic.quote_distances.stats()['cache_size'], use='quote')
+
+QUEUE_PENDING = metrics.REGISTRY.gauge('drivesync_job_queue_pending', 'Jobs queued or running in the background pool.')
+STORED_RECORDS = metrics.REGISTRY.gauge('drivesync_records', 'Records held in memory by kind.', ('kind',))
+DISTANCE_CACHE_ENTRIES = metrics.REGISTRY.gauge('drivesync_distance_cache_entries', 'Entries in the ad-hoc distance LRU caches.',
+                                                ('use',))
+metrics.REGISTRY.add_collector(collect_gauges)
+
+def sync_storage():
+    logic.sync()
+
+# Pages anyone can hit without logging in; admission control applies to these only
+PUBLIC_ENDPOINTS = {'client_request', 'create_account', 'quote'}
+
+def too_many_requests(reason, retry_after):
+    metrics.ADMISSION_REJECTIONS.inc(reason=reason)
+    headers = {'Retry-After': str(max(int(math.ceil(retry_after)), 1))}
+    if request.path.startswith('/api/'):
+        return jsonify(error='Too many requests, please retry later.'), 429, headers
+    return Response('Too many requests, please retry later.\n', 429, headers, mimetype='text/plain')
+
+# Largest form body read for the per-email bucket; bigger or chunked posts are keyed by address only
+EMAIL_KEY_MAX_BODY = 8 * 1024
+
+def admit_public_request():
+    # Runs before storage sync. The address bucket and the concurrency slot need no body, so a
+    # rejected request costs next to nothing; the opt-in email bucket then parses small form posts only
+    if request.endpoint not in PUBLIC_ENDPOINTS:
+        return None
+    limiter = current_app.extensions['rate_limiter']
+    allowed, retry_after = limiter.take(f"ip:{request.remote_addr}")
+    if not allowed:
+        return too_many_requests('ip_rate', retry_after)
+    if not current_app.extensions['public_slots'].try_acquire():
+        return too_many_requests('concurrency', 1)
+    g.public_slot = True
+    if (current_app.config['PUBLIC_EMAIL_RATE_LIMIT'] and request.method == 'POST'
+            and request.mimetype == 'application/x-www-form-urlencoded'
+            and request.content_length is not None and request.content_length <= EMAIL_KEY_MAX_BODY):
+        email = request.form.get('email', '').strip().casefold()
+        if email:
+            allowed, retry_after = limiter.take(f"email:{email}")
+            if not allowed:
+                return too_many_requests('email_rate', retry_after)
+    return None
+
+def release_public_slot(exc):
+    if g.pop('public_slot', False):
+        current_app.extensions['public_slots'].release()
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 200
+
+DASHBOARD_SORTS = {
+    'requests': {'created': None, 'cost': attrgetter('estimated_cost'), 'name': lambda r: r.name.casefold()},
+    'trips': {'created': None, 'cost': attrgetter('total_cost'), 'distance': attrgetter('distance')},
+    'accounts': {'created': None, 'name': lambda a: a.name.casefold(), 'id': attrgetter('account_id')},
+}
+
+def dashboard_section(name, sequence, per_page, predicate=None):
+    args = request.args.to_dict()
+    sort = args.get(f'{name}_sort', 'created')
+    if sort not in DASHBOARD_SORTS[name]:
+        sort = 'created'
+    order = 'desc' if args.get(f'{name}_order') == 'desc' else 'asc'
+    page = paginate(sequence, per_page, after=args.get(f'{name}_after'), sort_key=DASHBOARD_SORTS[name][sort],
+                    descending=order == 'desc', predicate=predicate)
+    next_url = url_for('home', **{**args, f'{name}_after': page.next_cursor}) if page.next_cursor else None
+    first_url = url_for('home', **{k: v for k, v in args.items() if k != f'{name}_after'}) if args.get(f'{name}_after') else None
+    return {'page': page, 'sort': sort, 'order': order, 'sorts': list(DASHBOARD_SORTS[name]), 'next_url': next_url, 'first_url': first_url}
 
 def is_admin_logged_in():
     return session.get('admin_logged_in', False)
 
-class ClientForm(FlaskForm):
-    account_id = StringField('Account ID', validators=[DataRequired()])
-    name = StringField('Name', validators=[DataRequired()])
-    email = StringField('Email', validators=[DataRequired(), Email()])
-    contact = StringField('Contact', validators=[DataRequired()])
-    submit = SubmitField('Create Client')
-
-class DriverForm(FlaskForm):
-    account_id = StringField('Account ID', validators=[DataRequired()])
-    name = StringField('Name', validators=[DataRequired()])
-    email = StringField('Email', validators=[DataRequired(), Email()])
-    contact = StringField('Contact', validators=[DataRequired()])
-    vehicle_type = SelectField('Vehicle Type', choices=[
-        ('', 'Select Vehicle Type'), ('Van', 'Van'), ('Truck', 'Truck'), ('Car', 'Car'), ('Bus', 'Bus')
-    ], validators=[DataRequired()])
-    vehicle_reg_no = SelectField('Vehicle Registration Number', validators=[DataRequired()])
-    driver_day_allowance = FloatField('Day Allowance (UGX)', validators=[DataRequired(), NumberRange(min=0)])
-    driver_night_allowance = FloatField('Night Allowance (UGX)', validators=[DataRequired(), NumberRange(min=0)])
-    submit = SubmitField('Add Driver')
-
-    def __init__(self, vehicles, *args, **kwargs):
-        super(DriverForm, self).__init__(*args, **kwargs)
-        self.vehicle_reg_no.choices = [('', 'Select Vehicle')] + [(v.vehicle_reg_no, v.vehicle_reg_no) for v in vehicles]
-
-class VehicleForm(FlaskForm):
-    vehicle_type = SelectField('Vehicle Type', choices=[
-        ('', 'Select Vehicle Type'), ('Van', 'Van'), ('Truck', 'Truck'), ('Car', 'Car'), ('Bus', 'Bus')
-    ], validators=[DataRequired()])
-    vehicle_reg_no = StringField('Vehicle Registration Number', validators=[DataRequired()])
-    fuel_litres_per_km = FloatField('Fuel Litres per KM', validators=[DataRequired(), NumberRange(min=0)])
-    daily_vehicle_charges = FloatField('Daily Vehicle Charges (UGX)', validators=[DataRequired(), NumberRange(min=0)])
-    submit = SubmitField('Add Vehicle')
-
-class TripForm(FlaskForm):
-    client_id = SelectField('Client ID', validators=[DataRequired()])
-    driver_id = SelectField('Driver ID', validators=[DataRequired()])
-    start_location = SelectField('Start Location', choices=[('', 'Select Start Location')] + [(loc[0], loc[0]) for loc in LOCATIONS])
-    start_location_lat = FloatField('Start Latitude (Override)')
-    start_location_lon = FloatField('Start Longitude (Override)')
-    end_location = SelectField('End Location', choices=[('', 'Select End Location')] + [(loc[0], loc[0]) for loc in LOCATIONS])
-    end_location_lat = FloatField('End Latitude (Override)')
-    end_location_lon = FloatField('End Longitude (Override)')
-    fuel_cost = FloatField('Fuel Cost per Litre (UGX)', validators=[DataRequired(), NumberRange(min=0)])
-    submit = SubmitField('Process Trip')
-
-    def __init__(self, clients, drivers, *args, **kwargs):
-        super(TripForm, self).__init__(*args, **kwargs)
-        self.client_id.choices = [('', 'Select Client')] + [(c.account_id, f"{c.account_id} - {c.name}") for c in clients]
-        self.driver_id.choices = [('', 'Select Driver')] + [(d.account_id, f"{d.account_id} - {d.name}") for d in drivers]
-
-    def validate(self):
-        if not super(TripForm, self).validate():
-            return False
-        # Validate start location
-        if not self.start_location.data and not (self.start_location_lat.data and self.start_location_lon.data):
-            self.start_location.errors.append("Please select a start location or provide valid coordinates.")
-            return False
-        # Validate end location
-        if not self.end_location.data and not (self.end_location_lat.data and self.end_location_lon.data):
-            self.end_location.errors.append("Please select an end location or provide valid coordinates.")
-            return False
-        return True
-
-class ClientRequestForm(FlaskForm):
-    name = StringField('Name', validators=[DataRequired()])
-    email = StringField('Email', validators=[DataRequired(), Email()])
-    contact = StringField('Contact', validators=[DataRequired()])
-    goods_description = TextAreaField('Description of Goods', validators=[DataRequired()])
-    pick_up_point = SelectField('Pick-up Point', choices=[('', 'Select Pick-up Point')] + [(loc[0], loc[0]) for loc in LOCATIONS], validators=[DataRequired()])
-    drop_off_point = SelectField('Drop-off Point', choices=[('', 'Select Drop-off Point')] + [(loc[0], loc[0]) for loc in LOCATIONS], validators=[DataRequired()])
-    comments = TextAreaField('Comments')
-    submit = SubmitField('Submit Request')
-
-class LoginForm(FlaskForm):
-    username = StringField('Username', validators=[DataRequired()])
-    password = PasswordField('Password', validators=[DataRequired()])
-    submit = SubmitField('Login')
-
-@flask_app.route('/')
+@route('/')
 def home():
     if not is_admin_logged_in():
         flash('Please log in as admin to access the dashboard.', 'error')
         return redirect(url_for('login'))
-    return render_template('index.html', drivers=logic.drivers, clients=logic.clients, accounts=logic.list_all_accounts(), requests=logic.client_requests, trips=logic.trips, active_page='home')
+    per_page = min(max(request.args.get('per_page', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+
+    # Snapshots fix each listing's length for this render without copying or locking it, so
+    # concurrent writes neither block the dashboard nor shift rows under the paginator
+    query = request.args.get('requests_q', '').strip().casefold()
+    requests_section = dashboard_section('requests', logic.client_requests.snapshot(), per_page, predicate=(
+        (lambda r: query in r.name.casefold() or query in r.email.casefold() or query in (r.goods_description or '').casefold())
+        if query else None
+    ))
+
+    if request.args.get('trips_client'):
+        trips = logic.trips_for_client(request.args['trips_client'])
+    elif request.args.get('trips_driver'):
+        trips = logic.trips_for_driver(request.args['trips_driver'])
+    else:
+        trips = logic.trips.snapshot()
+    trips_section = dashboard_section('trips', trips, per_page)
+
+    account_type = request.args.get('accounts_type')
+    drivers, clients = logic.drivers.snapshot(), logic.clients.snapshot()
+    accounts = {'driver': drivers, 'client': clients}.get(account_type) or ChainedSequence(drivers, clients)
+    query = request.args.get('accounts_q', '').strip().casefold()
+    accounts_section = dashboard_section('accounts', accounts, per_page, predicate=(
+        (lambda a: query in a.name.casefold() or query in a.account_id.casefold()) if query else None
+    ))
+
+    from forms import CloseRequestForm
+    context = dict(requests=requests_section, trips=trips_section, accounts=accounts_section,
+                   close_form=CloseRequestForm(), active_page='home')
+    if request.args.get('stream'):
+        # Send the page as Jinja renders it so the browser gets the first rows before the last are built
+        current_app.update_template_context(context)
+        template = current_app.jinja_env.get_template('index.html')
+        return Response(stream_with_context(template.generate(context)), mimetype='text/html')
+    return render_template('index.html', **context)
 
-@flask_app.route('/login', methods=['GET', 'POST'])
+@route('/login', methods=['GET', 'POST'])
 def login():
+    from forms import LoginForm
     if is_admin_logged_in():
         return redirect(url_for('home'))
     form = LoginForm()
@@ -138,14 +226,15 @@ def login():
             flash('Invalid username or password.', 'error')
     return render_template('login.html', form=form, active_page='login')
 
-@flask_app.route('/logout')
+@route('/logout')
 def logout():
     session.pop('admin_logged_in', None)
     flash('You have been logged out.', 'success')
     return redirect(url_for('login'))
 
-@flask_app.route('/create_account', methods=['GET', 'POST'])
+@route('/create_account', methods=['GET', 'POST'])
 def create_account():
+    from forms import ClientForm
     form = ClientForm()
     if form.validate_on_submit():
         try:
@@ -162,8 +251,9 @@ def create_account():
             flash(f'Error creating account: {str(e)}', 'error')
     return render_template('create_account.html', form=form, active_page='create_account')
 
-@flask_app.route('/add_driver', methods=['GET', 'POST'])
+@route('/add_driver', methods=['GET', 'POST'])
 def add_driver():
+    from forms import DriverForm
     if not is_admin_logged_in():
         flash('Please log in as admin to access this page.', 'error')
         return redirect(url_for('login'))
@@ -180,7 +270,7 @@ def add_driver():
                 driver_day_allowance=form.driver_day_allowance.data,
                 driver_night_allowance=form.driver_night_allowance.data
             )
-            vehicle = next((v for v in logic.vehicles if v.vehicle_reg_no == form.vehicle_reg_no.data), None)
+            vehicle = logic.get_vehicle(form.vehicle_reg_no.data)
             if vehicle:
                 driver.vehicle = vehicle
             else:
@@ -192,8 +282,9 @@ def add_driver():
             flash(f'Error adding driver: {str(e)}', 'error')
     return render_template('add_driver.html', form=form, active_page='add_driver')
 
-@flask_app.route('/add_vehicle', methods=['GET', 'POST'])
+@route('/add_vehicle', methods=['GET', 'POST'])
 def add_vehicle():
+    from forms import VehicleForm
     if not is_admin_logged_in():
         flash('Please log in as admin to access this page.', 'error')
         return redirect(url_for('login'))
@@ -213,8 +304,56 @@ def add_vehicle():
             flash(f'Error adding vehicle: {str(e)}', 'error')
     return render_template('add_vehicle.html', form=form, active_page='add_vehicle')
 
-@flask_app.route('/process_trip', methods=['GET', 'POST'])
+@route('/set_fuel_cost', methods=['GET', 'POST'])
+def set_fuel_cost():
+    from forms import FuelPriceForm, RepriceQuotesForm, VEHICLE_TYPES
+    if not is_admin_logged_in():
+        flash('Please log in as admin to access this page.', 'error')
+        return redirect(url_for('login'))
+    form = FuelPriceForm()
+    if form.validate_on_submit():
+        try:
+            repriced = logic.set_fuel_price(form.fuel_cost.data, form.vehicle_type.data or None, form.effective_from.data)
+            flash(f'Fuel price saved. {len(repriced)} open quote(s) repriced.', 'success')
+            return redirect(url_for('set_fuel_cost'))
+        except Exception as e:
+            flash(f'Error setting fuel price: {str(e)}', 'error')
+    current_prices = [(t, logic.fuel_prices.price(t)) for t in VEHICLE_TYPES]
+    return render_template('set_fuel_cost.html', form=form, prices=logic.fuel_prices.entries(),
+                           current_prices=current_prices, default_price=logic.fuel_prices.default_price,
+                           reprice_form=RepriceQuotesForm(),
+                           active_page='set_fuel_cost')
+
+@route('/reprice_quotes', methods=['POST'])
+def reprice_quotes():
+    from forms import RepriceQuotesForm
+    if not is_admin_logged_in():
+        flash('Please log in as admin to access this page.', 'error')
+        return redirect(url_for('login'))
+    if RepriceQuotesForm().validate_on_submit():
+        repriced = logic.reprice_quotes()
+        flash(f'{len(repriced)} open quote(s) repriced.', 'success')
+    else:
+        flash('Form expired, please try again.', 'error')
+    return redirect(url_for('set_fuel_cost'))
+
+@route('/client_requests/<request_id>/close', methods=['POST'])
+def close_client_request(request_id):
+    from forms import CloseRequestForm
+    if not is_admin_logged_in():
+        flash('Please log in as admin to access this page.', 'error')
+        return redirect(url_for('login'))
+    if not CloseRequestForm().validate_on_submit():
+        flash('Form expired, please try again.', 'error')
+    elif logic.close_client_requests([request_id]):
+        flash('Client request closed.', 'success')
+    else:
+        flash('Client request not found or already closed.', 'warning')
+    return redirect(request.referrer or url_for('home'))
+
+@route('/process_trip', methods=['GET', 'POST'])
 def process_trip():
+    from forms import TripForm
     if not is_admin_logged_in():
         flash('Please log in as admin to access this page.', 'error')
         return redirect(url_for('login'))
@@ -224,12 +363,12 @@ def process_trip():
             start_coords = None
             end_coords = None
             if form.start_location.data and form.start_location.data != '':
-                start_coords = next(loc[1] for loc in LOCATIONS if loc[0] == form.start_location.data)
+                start_coords = gazetteer().coords(form.start_location.data)
             elif form.start_location_lat.data and form.start_location_lon.data:
                 start_coords = (form.start_location_lat.data, form.start_location_lon.data)
             
             if form.end_location.data and form.end_location.data != '':
-                end_coords = next(loc[1] for loc in LOCATIONS if loc[0] == form.end_location.data)
+                end_coords = gazetteer().coords(form.end_location.data)
             elif form.end_location_lat.data and form.end_location_lon.data:
                 end_coords = (form.end_location_lat.data, form.end_location_lon.data)
             
@@ -242,7 +381,9 @@ def process_trip():
                 driver_id=form.driver_id.data,
                 start=start_coords,
                 end=end_coords,
-                fuel_cost=form.fuel_cost.data
+                fuel_cost=form.fuel_cost.data,
+                starts_at=form.starts_at.data,
+                ends_at=form.ends_at.data
             )
             if "⚠️" in result:
                 flash(result, 'error')
@@ -251,28 +392,32 @@ def process_trip():
             return redirect(url_for('home'))
         except Exception as e:
             flash(f'Error processing trip: {str(e)}', 'error')
+    if request.method == 'GET':
+        form.fuel_cost.data = logic.fuel_prices.price()
+        form.starts_at.data = datetime.now().replace(second=0, microsecond=0)
     return render_template('process_trip.html', form=form, active_page='process_trip')
 
-@flask_app.route('/client_request', methods=['GET', 'POST'])
+@route('/client_request', methods=['GET', 'POST'])
 def client_request():
+    from forms import ClientRequestForm
     form = ClientRequestForm()
     if form.validate_on_submit():
         try:
-            pick_up_coords = next(loc[1] for loc in LOCATIONS if loc[0] == form.pick_up_point.data)
-            drop_off_coords = next(loc[1] for loc in LOCATIONS if loc[0] == form.drop_off_point.data)
+            pick_up = gazetteer().get(form.pick_up_point.data)
+            drop_off = gazetteer().get(form.drop_off_point.data)
             
             client_request = ClientRequest(
                 name=form.name.data,
                 email=form.email.data,
                 contact=form.contact.data,
                 goods_description=form.goods_description.data,
-                pick_up_point=pick_up_coords,
-                drop_off_point=drop_off_coords,
+                pick_up_point=pick_up.point,
+                drop_off_point=drop_off.point,
                 comments=form.comments.data,
                 client_id=None,
                 estimated_cost=0.0,
-                pick_up_name=form.pick_up_point.data,
-                drop_off_name=form.drop_off_point.data
+                pick_up_name=pick_up.name,
+                drop_off_name=drop_off.name
             )
             client = logic.add_client_request(client_request)
             client_request.client_id = client.account_id
@@ -281,21 +426,491 @@ def client_request():
                                  cost=client_request.estimated_cost,
                                  client_name=client.name,
                                  active_page='client_request')
+        except BacklogFull as e:
+            metrics.ADMISSION_REJECTIONS.inc(reason='backlog')
+            flash(f'We are not taking new requests right now, please try again later. ({str(e)})', 'error')
+            return render_template('client_request.html', form=form, active_page='client_request'), 503, {'Retry-After': '60'}
         except Exception as e:
             flash(f'Error submitting request: {str(e)}', 'error')
     return render_template('client_request.html', form=form, active_page='client_request')
 
-@flask_app.route('/history/<client_id>')
+@route('/history/<client_id>')
 def history(client_id):
     if not is_admin_logged_in():
         flash('Please log in as admin to access this page.', 'error')
         return redirect(url_for('login'))
-    client = next((c for c in logic.clients if c.account_id == client_id), None)
+    client = logic.get_client(client_id)
     if not client:
         flash('Client not found.', 'error')
         return redirect(url_for('home'))
-    trips = [trip for trip in logic.trips if trip.client_id == client_id]
-    return render_template('history.html', client=client, trips=trips, active_page='history')
+    trips = logic.trips_for_client(client_id)
+    return render_template('history.html', client=client, trips=trips, summary=logic.summary('clients', client_id), active_page='history')
+
+@route('/stats')
+def stats():
+    if not is_admin_logged_in():
+        return jsonify(error='Admin login required.'), 401
+    days = request.args.get('days', type=int)
+    return jsonify(overall=logic.aggregates.overall.to_dict(), daily=logic.aggregates.daily_summary(days=days))
+
+@route('/stats/<kind>/<key>')
+def entity_stats(kind, key):
+    if not is_admin_logged_in():
+        return jsonify(error='Admin login required.'), 401
+    if kind not in logic.aggregates.KINDS:
+        return jsonify(error=f"Unknown stats kind '{kind}'."), 404
+    return jsonify(kind=kind, key=key, **logic.summary(kind, key))
+
+IMPORT_FIELDS = ('name', 'email', 'contact', 'goods_description', 'pick_up_point', 'drop_off_point', 'comments')
+
+def import_record_validator():
+    # Same validators as the public /client_request form, minus CSRF. One form instance is
+    # re-processed per record because binding a fresh form costs as much as validating it.
+    from forms import ClientRequestForm
+    from werkzeug.datastructures import MultiDict
+    form = ClientRequestForm(formdata=None, meta={'csrf': False})
+    places = gazetteer()
+
+    def validate(record):
+        form.process(MultiDict({field: str(record.get(field) or '') for field in IMPORT_FIELDS}))
+        if not form.validate():
+            return None, [f"{field}: {message}" for field, messages in form.errors.items() for message in messages]
+        pick_up = places.get(form.pick_up_point.data)
+        drop_off = places.get(form.drop_off_point.data)
+        return ClientRequest(
+            name=form.name.data,
+            email=form.email.data,
+            contact=form.contact.data,
+            goods_description=form.goods_description.data,
+            pick_up_point=pick_up.point,
+            drop_off_point=drop_off.point,
+            comments=form.comments.data,
+            pick_up_name=pick_up.name,
+            drop_off_name=drop_off.name
+        ), None
+    return validate
+
+@route('/import_requests', methods=['GET', 'POST'])
+def import_requests():
+    from forms import ImportRequestsForm
+    if not is_admin_logged_in():
+        flash('Please log in as admin to access this page.', 'error')
+        return redirect(url_for('login'))
+    form = ImportRequestsForm()
+    report = None
+    if form.validate_on_submit():
+        upload = form.file.data
+        fmt = form.file_format.data or importer.detect_format(upload.filename)
+        try:
+            lines = io.TextIOWrapper(upload.stream, encoding='utf-8', newline='')
+            report = importer.import_requests(lines, fmt, logic, import_record_validator()).to_dict()
+            flash(f"Imported {report['imported']} of {report['processed']} requests "
+                  f"({report['records_per_second']:,.0f} records/sec).", 'success' if not report['failed'] else 'warning')
+        except Exception as e:
+            flash(f'Error importing requests: {str(e)}', 'error')
+    return render_template('import_requests.html', form=form, report=report, active_page='import_requests')
+
+@click.command('import-requests', help='Import client requests from a JSONL or CSV file.')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(importer.FORMATS), help='Defaults to the file extension.')
+@click.option('--batch-size', default=500, show_default=True)
+@with_appcontext
+def import_requests_command(path, fmt, batch_size):
+    with open(path, encoding='utf-8', newline='') as lines:
+        report = importer.import_requests(lines, fmt or importer.detect_format(path), logic,
+                                          import_record_validator(), batch_size=batch_size)
+    for error in report.errors:
+        click.echo(f"record {error['record']}: {'; '.join(error['errors'])}", err=True)
+    if report.stopped:
+        click.echo(f"stopped: {report.stopped}", err=True)
+    summary = report.to_dict()
+    del summary['errors']
+    click.echo(json.dumps(summary))
+
+def checked_point(latitude, longitude, value):
+    if not (math.isfinite(latitude) and math.isfinite(longitude)
+            and -90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError(f"Coordinates out of range '{value}'")
+    return (latitude, longitude)
+
+def resolve_point(value):
+    if isinstance(value, str):
+        return gazetteer().coords(value)
+    if (isinstance(value, (list, tuple)) and len(value) == 2
+            and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value)):
+        return checked_point(float(value[0]), float(value[1]), value)
+    raise ValueError("Locations must be a known location name or a [latitude, longitude] pair")
+
+def query_point(value):
+    # Query string form of resolve_point: a location name or "latitude,longitude"
+    if value and ',' in value:
+        try:
+            latitude, longitude = (float(part) for part in value.split(','))
+        except ValueError:
+            raise ValueError(f"Invalid coordinates '{value}'")
+        return checked_point(latitude, longitude, value)
+    return resolve_point(value or None)
+
+@route('/api/locations')
+def location_suggestions():
+    # Autocomplete for pick-up and drop-off points: one trie walk per keystroke, no scan
+    limit = max(1, min(request.args.get('limit', 10, type=int), 20))
+    places = gazetteer().search(request.args.get('q', ''), limit)
+    response = jsonify(locations=[place.to_dict() for place in places])
+    response.cache_control.public = True
+    response.cache_control.max_age = 3600
+    return response
+
+@route('/api/quote')
+def quote():
+    # Public and read-only: prices one lane without creating a client or storing a request
+    try:
+        start = query_point(request.args.get('pick_up'))
+        end = query_point(request.args.get('drop_off'))
+        vehicle_type = request.args.get('vehicle_type') or None
+        if vehicle_type and vehicle_type not in COMPATIBLE_VEHICLE_TYPES:
+            raise ValueError(f"Unknown vehicle type '{vehicle_type}'")
+        fuel_cost = request.args.get('fuel_cost', type=float)
+        if fuel_cost is not None and not (math.isfinite(fuel_cost) and fuel_cost > 0):
+            raise ValueError("Fuel cost must be greater than zero")
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    # Keyed on the price in force rather than the parameter, so a price change is a cache miss
+    fuel_cost = fuel_cost or logic.fuel_prices.price(vehicle_type or logic.default_vehicle.vehicle_type)
+    cache = current_app.extensions['quote_cache']
+    key = (start, end, vehicle_type, fuel_cost)
+    cached = cache.get(key)
+    if cached is None:
+        metrics.QUOTE_CACHE_LOOKUPS.inc(result='miss')
+        trip = logic.quote(start, end, vehicle_type, fuel_cost)
+        body = json.dumps({
+            'pick_up': list(start),
+            'drop_off': list(end),
+            'vehicle_type': vehicle_type or logic.default_vehicle.vehicle_type,
+            'fuel_cost': fuel_cost,
+            'distance_km': round(trip.distance, 3),
+            'total_cost': round(trip.total_cost, 2),
+        }, sort_keys=True)
+        cached = (body, hashlib.sha1(body.encode()).hexdigest())
+        cache.set(key, cached)
+    else:
+        metrics.QUOTE_CACHE_LOOKUPS.inc(result='hit')
+    body, etag = cached
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = cache.ttl
+    # Turns the response into a bodiless 304 when If-None-Match matches
+    return response.make_conditional(request)
+
+@route('/api/quotes', methods=['POST'])
+def batch_quotes():
+    if not is_admin_logged_in():
+        return jsonify(error='Admin login required.'), 401
+    payload = request.get_json(silent=True) or {}
+    lanes = payload.get('lanes')
+    if not isinstance(lanes, list) or not lanes:
+        return jsonify(error='Request body must contain a non-empty "lanes" list.'), 400
+    if len(lanes) > MAX_BATCH_LANES:
+        return jsonify(error=f'At most {MAX_BATCH_LANES} lanes per request.'), 400
+    verify = payload.get('verify') or 0
+    # A number of lanes to re-measure (true means one); JSON floats and strings are not accepted
+    if not isinstance(verify, int) or verify < 0:
+        return jsonify(error='"verify" must be a whole number of lanes to check.'), 400
+    default_fuel_cost = payload.get('fuel_cost')
+    starts, ends, fuel_costs, vehicles, drivers = [], [], [], [], []
+    try:
+        for position, lane in enumerate(lanes):
+            starts.append(resolve_point(lane.get('pick_up')))
+            ends.append(resolve_point(lane.get('drop_off')))
+            fuel_cost = lane.get('fuel_cost', default_fuel_cost)
+            vehicle = driver = None
+            if lane.get('vehicle_reg_no'):
+                vehicle = logic.get_vehicle(lane['vehicle_reg_no'])
+                if not vehicle:
+                    raise ValueError(f"Vehicle '{lane['vehicle_reg_no']}' not found")
+            if lane.get('driver_id'):
+                driver = logic.get_driver(lane['driver_id'])
+                if not driver:
+                    raise ValueError(f"Driver '{lane['driver_id']}' not found")
+            if fuel_cost is None:
+                fuel_cost = logic.fuel_prices.price((vehicle or logic.default_vehicle).vehicle_type)
+            fuel_costs.append(float(fuel_cost))
+            vehicles.append(vehicle)
+            drivers.append(driver)
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify(error=f'Lane {position}: {e}'), 400
+
+    distances, costs = logic.quote_batch(starts, ends, fuel_costs, vehicles=vehicles, drivers=drivers)
+    response = {
+        'count': len(lanes),
+        'quotes': [{'distance_km': round(float(d), 3), 'total_cost': round(float(c), 2)} for d, c in zip(distances, costs)]
+    }
+    if verify:
+        import batch
+        # Lanes are measured with the quote distance model, so they are held to its error bound
+        bound_km = max(MAX_ERROR[logic.quote_distances.model][0], 0.05)
+        response['tolerance'] = batch.check_tolerance(starts, ends, distances, sample_size=int(verify),
+                                                      tolerance_km=bound_km)
+    return jsonify(response)
+
+@route('/api/drivers/<driver_id>/position', methods=['POST'])
+def update_driver_position(driver_id):
+    if not is_admin_logged_in():
+        return jsonify(error='Admin login required.'), 401
+    payload = request.get_json(silent=True) or {}
+    try:
+        position = resolve_point(payload['position']) if payload.get('position') is not None else None
+        available = payload.get('available')
+        if available is not None and not isinstance(available, bool):
+            raise ValueError('"available" must be true or false')
+        driver = logic.update_driver_position(driver_id, position=position, available=available)
+    except KeyError as e:
+        return jsonify(error=str(e.args[0])), 404
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(driver_id=driver.account_id, position=driver.position, available=driver.available)
+
+@route('/api/client_requests/<int:index>/drivers')
+def nearest_drivers(index):
+    if not is_admin_logged_in():
+        return jsonify(error='Admin login required.'), 401
+    if not 0 <= index < len(logic.client_requests):
+        return jsonify(error='Client request not found.'), 404
+    client_request = logic.client_requests[index]
+    k = min(max(request.args.get('k', 5, type=int), 1), 50)
+    return jsonify(drivers=[
+        {'driver_id': driver.account_id, 'name': driver.name, 'vehicle_type': driver.vehicle_type,
+         'position': driver.position, 'distance_km': round(distance, 3)}
+        for driver, distance in logic.nearest_drivers(client_request, k=k)
+    ])
+
+def parse_time(value):
+    # ISO 8601 date and time as naive local time, or None when absent
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError("Times must be ISO 8601 strings")
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid time '{value}'")
+    return local_time(parsed)
+
+def query_window():
+    starts_at = parse_time(request.args.get('starts_at'))
+    ends_at = parse_time(request.args.get('ends_at'))
+    if not (starts_at and ends_at):
+        raise ValueError('"starts_at" and "ends_at" are required')
+    if ends_at <= starts_at:
+        raise ValueError('"ends_at" must be after "starts_at"')
+    return starts_at, ends_at
+
+@route('/api/availability')
+def availability():
+    # Drivers and vehicles with no trip booked between starts_at and ends_at
+    if not is_admin_logged_in():
+        return jsonify(error='Admin login required.'), 401
+    try:
+        starts_at, ends_at = query_window()
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(
+        starts_at=starts_at.isoformat(),
+        ends_at=ends_at.isoformat(),
+        drivers=[{'driver_id': driver.account_id, 'name': driver.name, 'vehicle_reg_no': driver.vehicle.vehicle_reg_no,
+                  'vehicle_type': driver.vehicle.vehicle_type} for driver in logic.free_drivers(starts_at, ends_at)],
+        vehicles=[{'vehicle_reg_no': vehicle.vehicle_reg_no, 'vehicle_type': vehicle.vehicle_type}
+                  for vehicle in logic.free_vehicles(starts_at, ends_at)]
+    )
+
+@route('/api/vehicles/utilization')
+def vehicle_utilization():
+    if not is_admin_logged_in():
+        return jsonify(error='Admin login required.'), 401
+    try:
+        starts_at, ends_at = query_window()
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(starts_at=starts_at.isoformat(), ends_at=ends_at.isoformat(),
+                   vehicles=logic.vehicle_utilization(starts_at, ends_at))
+
+@route('/api/consolidation_plan')
+def consolidation_plan():
+    # Groups pending client requests into multi-stop routes; nothing is booked, this only reports the plan
+    if not is_admin_logged_in():
+        return jsonify(error='Admin login required.'), 401
+    plan = logic.plan_consolidation(
+        fuel_cost=request.args.get('fuel_cost', type=float),
+        max_stops=min(max(request.args.get('max_stops', 6, type=int), 1), 50),
+        max_route_km=max(request.args.get('max_route_km', 600, type=float), 0)
+    )
+    return jsonify(plan.to_dict())
+
+@route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@route('/metrics/profile')
+def profile():
+    # Opt-in (DRIVESYNC_PROFILING=1): samples stacks for ?seconds=, optionally only threads serving
+    # ?endpoint=, and returns collapsed stacks ready for flamegraph.pl or speedscope
+    if not PROFILING_ENABLED:
+        return jsonify(error='Profiling is disabled; set DRIVESYNC_PROFILING=1 to enable it.'), 404
+    if not is_admin_logged_in():
+        return jsonify(error='Admin login required.'), 401
+    seconds = min(max(request.args.get('seconds', 10, type=float), 0.1), 60)
+    interval = min(max(request.args.get('interval', 0.005, type=float), 0.001), 1)
+    endpoint = request.args.get('endpoint')
+    if not profiler_lock.acquire(blocking=False):
+        return jsonify(error='A profile is already being captured.'), 409
+    try:
+        profiler = metrics.SamplingProfiler(interval=interval)
+        own = threading.get_ident()
+        profiler.start(thread_filter=lambda ident: ident != own and (not endpoint or ACTIVE_ENDPOINTS.get(ident) == endpoint))
+        time.sleep(seconds)
+        profiler.stop()
+    finally:
+        profiler_lock.release()
+    return Response(profiler.collapsed(), mimetype='text/plain', headers={'X-Profile-Samples': str(profiler.samples)})
+
+@route('/api/jobs/<job_id>')
+def job_status(job_id):
+    job = logic.jobs.get(job_id) if logic.jobs else None
+    if not job:
+        return jsonify(error='Job not found.'), 404
+    # Estimate ids are handed to the public confirmation page; anything else is admin work
+    if job.name != 'estimate' and not is_admin_logged_in():
+        return jsonify(error='Admin login required.'), 401
+    return jsonify(job.to_dict())
+
+@route('/api/estimates/<job_id>')
+def estimate_status(job_id):
+    # What the dashboard stores for the request, after any repricing, rather than the job's raw result
+    client_request = logic.client_requests.get('job_id', job_id)
+    if not client_request:
+        return jsonify(error='Request not found.'), 404
+    return jsonify(status=client_request.estimate_status, estimated_cost=client_request.estimated_cost)
+
+@route('/api/trips', methods=['POST'])
+def bulk_process_trips():
+    if not is_admin_logged_in():
+        return jsonify(error='Admin login required.'), 401
+    payload = request.get_json(silent=True) or {}
+    entries = payload.get('trips')
+    if not isinstance(entries, list) or not entries:
+        return jsonify(error='Request body must contain a non-empty "trips" list.'), 400
+    trips = []
+    try:
+        for position, entry in enumerate(entries):
+            trips.append({
+                'client_id': entry['client_id'],
+                'driver_id': entry['driver_id'],
+                'start': resolve_point(entry.get('pick_up')),
+                'end': resolve_point(entry.get('drop_off')),
+                'fuel_cost': float(entry['fuel_cost']),
+                'starts_at': parse_time(entry.get('starts_at')),
+                'ends_at': parse_time(entry.get('ends_at'))
+            })
+    except (KeyError, ValueError, TypeError, AttributeError) as e:
+        return jsonify(error=f'Trip {position}: {e}'), 400
+    try:
+        job = logic.submit_trips(trips)
+    except QueueFull as e:
+        return jsonify(error=str(e)), 503, {'Retry-After': '5'}
+    return jsonify(job.to_dict()), 202, {'Location': url_for('job_status', job_id=job.id)}
+
+def create_app(config=None, logic=None, warm=True):
+    flask_app = Flask(__name__)
+    flask_app.config['SECRET_KEY'] = 'your-secret-key'  # Replace in production
+    flask_app.config.update(config or {})
+    # Compiled templates are shared between processes and restarts through the bytecode cache
+    cache_dir = os.environ.get('DRIVESYNC_TEMPLATE_CACHE')
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    flask_app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    flask_app.jinja_env.filters['format_number'] = format_number
+    flask_app.jinja_env.filters['place_name'] = place_name
+
+    if logic is None:
+        # Set DRIVESYNC_DATABASE to a file path to share state between worker processes via SQLite
+        database_path = os.environ.get('DRIVESYNC_DATABASE')
+        # Background pool for cost estimates and bulk trip processing
+        jobs = JobQueue(
+            workers=int(os.environ.get('DRIVESYNC_WORKERS', 4)),
+            mode=os.environ.get('DRIVESYNC_WORKER_MODE', 'thread'),
+            max_pending=int(os.environ.get('DRIVESYNC_QUEUE_DEPTH', 1000))
+        )
+        logic = DriveSyncApp(
+            storage=SQLiteStorage(database_path) if database_path else None,
+            jobs=jobs,
+            # Optional file prefix for memory-mapping older trip columns instead of keeping them on the heap
+            trip_spill_path=os.environ.get('DRIVESYNC_TRIP_SPILL_PATH'),
+            # geodesic, haversine or equirectangular; error bounds are listed in distance.MAX_ERROR
+            quote_distance_model=os.environ.get('DRIVESYNC_QUOTE_DISTANCE_MODEL', 'equirectangular'),
+            trip_distance_model=os.environ.get('DRIVESYNC_TRIP_DISTANCE_MODEL', 'geodesic'),
+            max_client_requests=int(os.environ.get('DRIVESYNC_MAX_CLIENT_REQUESTS', 200000)) or None
+        )
+    flask_app.extensions['drivesync'] = logic
+    flask_app.extensions['quote_cache'] = TTLCache(
+        maxsize=int(os.environ.get('DRIVESYNC_QUOTE_CACHE_SIZE', 4096)),
+        ttl=int(os.environ.get('DRIVESYNC_QUOTE_CACHE_TTL', 300))
+    )
+    # Admission control for PUBLIC_ENDPOINTS; the config keys override the environment
+    flask_app.config.setdefault('PUBLIC_RATE_LIMIT', float(os.environ.get('DRIVESYNC_PUBLIC_RATE', 1)))
+    flask_app.config.setdefault('PUBLIC_RATE_BURST', int(os.environ.get('DRIVESYNC_PUBLIC_BURST', 20)))
+    flask_app.config.setdefault('PUBLIC_CONCURRENCY', int(os.environ.get('DRIVESYNC_PUBLIC_CONCURRENCY', 8)))
+    flask_app.config.setdefault('PUBLIC_EMAIL_RATE_LIMIT',
+                                os.environ.get('DRIVESYNC_PUBLIC_EMAIL_LIMIT', '').lower() in ('1', 'true', 'yes'))
+    # Shared buckets need a shared file; by default that is the app database when there is one
+    buckets_path = os.environ.get('DRIVESYNC_RATE_LIMIT_DATABASE') or os.environ.get('DRIVESYNC_DATABASE')
+    flask_app.extensions['rate_limiter'] = RateLimiter(
+        flask_app.config['PUBLIC_RATE_LIMIT'], flask_app.config['PUBLIC_RATE_BURST'],
+        store=SQLiteBucketStore(buckets_path) if buckets_path else MemoryBucketStore()
+    )
+    flask_app.extensions['public_slots'] = ConcurrencyLimiter(flask_app.config['PUBLIC_CONCURRENCY'])
+
+    flask_app.before_request(start_request_timer)
+    flask_app.before_request(admit_public_request)
+    flask_app.before_request(sync_storage)
+    flask_app.after_request(record_request_time)
+    flask_app.teardown_request(forget_active_endpoint)
+    flask_app.teardown_request(release_public_slot)
+    before_render_template.connect(start_template_timer, flask_app)
+    template_rendered.connect(record_template_time, flask_app)
+    for rule, view, options in VIEWS:
+        flask_app.add_url_rule(rule, view_func=view, **options)
+    flask_app.cli.add_command(import_requests_command)
+
+    if warm:
+        warm_up(flask_app)
+    return flask_app
+
+def warm_up(flask_app):
+    # One-off costs a worker would otherwise pay on its first requests: the deferred geopy, numpy
+    # and form imports, loading the gazetteer, the distance matrices for LOCATIONS and compiling
+    # every template
+    for module in ('geopy.distance', 'batch', 'planner', 'forms'):
+        importlib.import_module(module)
+    gazetteer()
+    logic = flask_app.extensions['drivesync']
+    logic.distances.precompute(LOCATIONS)
+    logic.quote_distances.precompute(LOCATIONS)
+    for name in flask_app.jinja_env.list_templates():
+        flask_app.jinja_env.get_template(name)
+
+_default_app = None
+_default_app_lock = threading.Lock()
+
+def __getattr__(name):
+    # Keeps `app:flask_app` (gunicorn, flask run, scripts) working; the app is built on first use
+    global _default_app
+    if name != 'flask_app':
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _default_app_lock:
+        if _default_app is None:
+            _default_app = create_app()
+    return _default_app
 
 if __name__ == "__main__":
-    flask_app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
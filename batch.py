@@ -0,0 +1,110 @@
+import numpy as np
+import metrics
+from distance import EQUATORIAL_RADIUS_KM, FLATTENING, ECCENTRICITY_SQUARED, MEAN_RADIUS_KM, UGANDA_BOUNDS
+
+
+def geodesic_km(starts, ends):
+    # Lambert's formula for long lines on the ellipsoid; stays within a few metres of
+    # geodesic() for the distances we quote, without the per-pair iterative solve
+    starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+    ends = np.asarray(ends, dtype=float).reshape(-1, 2)
+    beta1 = np.arctan((1 - FLATTENING) * np.tan(np.radians(starts[:, 0])))
+    beta2 = np.arctan((1 - FLATTENING) * np.tan(np.radians(ends[:, 0])))
+    dlon = np.radians(ends[:, 1] - starts[:, 1])
+
+    h = np.sin((beta2 - beta1) / 2) ** 2 + np.cos(beta1) * np.cos(beta2) * np.sin(dlon / 2) ** 2
+    sigma = 2 * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+    p = (beta1 + beta2) / 2
+    q = (beta2 - beta1) / 2
+    half_cos = np.cos(sigma / 2) ** 2
+    half_sin = np.sin(sigma / 2) ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = (sigma - np.sin(sigma)) * np.sin(p) ** 2 * np.cos(q) ** 2 / half_cos
+        y = (sigma + np.sin(sigma)) * np.cos(p) ** 2 * np.sin(q) ** 2 / half_sin
+    correction = np.where(sigma > 0, x + y, 0.0)
+    return EQUATORIAL_RADIUS_KM * (sigma - FLATTENING / 2 * correction)
+
+
+# Array versions of the models in distance.py, same formulas term for term
+
+def haversine_km(starts, ends):
+    phi1 = np.radians(starts[:, 0])
+    phi2 = np.radians(ends[:, 0])
+    h = (np.sin((phi2 - phi1) / 2) ** 2 +
+         np.cos(phi1) * np.cos(phi2) * np.sin(np.radians(ends[:, 1] - starts[:, 1]) / 2) ** 2)
+    return 2 * MEAN_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+
+
+def equirectangular_km(starts, ends):
+    phi = np.radians((starts[:, 0] + ends[:, 0]) / 2)
+    w = 1 - ECCENTRICITY_SQUARED * np.sin(phi) ** 2
+    meridian = EQUATORIAL_RADIUS_KM * (1 - ECCENTRICITY_SQUARED) / w ** 1.5
+    prime_vertical = EQUATORIAL_RADIUS_KM / np.sqrt(w)
+    dlon = (ends[:, 1] - starts[:, 1] + 180) % 360 - 180
+    return np.hypot(np.radians(ends[:, 0] - starts[:, 0]) * meridian,
+                    np.radians(dlon) * prime_vertical * np.cos(phi))
+
+
+DISTANCE_MODELS = {
+    'geodesic': geodesic_km,
+    'haversine': haversine_km,
+    'equirectangular': equirectangular_km,
+}
+
+
+def distances_km(starts, ends, model='geodesic', geodesic=None):
+    # What DistanceService(model=model) would return for each lane: pairs with a point outside
+    # UGANDA_BOUNDS fall back to the geodesic. geodesic, if given, measures those lanes one pair at
+    # a time (e.g. DistanceService.distance, for the exact geopy figure); otherwise Lambert's formula does.
+    starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+    ends = np.asarray(ends, dtype=float).reshape(-1, 2)
+    if model == 'geodesic':
+        inside = np.zeros(len(starts), dtype=bool)
+        distances = np.zeros(len(starts))
+    else:
+        (south, west), (north, east) = UGANDA_BOUNDS
+        points = np.concatenate((starts, ends), axis=1)
+        inside = ((points[:, 0::2] >= south) & (points[:, 0::2] <= north) &
+                  (points[:, 1::2] >= west) & (points[:, 1::2] <= east)).all(axis=1)
+        distances = DISTANCE_MODELS[model](starts, ends)
+    if inside.all():
+        return distances
+    if geodesic is None:
+        return np.where(inside, distances, geodesic_km(starts, ends))
+    for lane in np.flatnonzero(~inside):
+        distances[lane] = geodesic(tuple(starts[lane]), tuple(ends[lane]))
+    return distances
+
+
+def estimate_batch(starts, ends, fuel_costs, fuel_litres_per_km, daily_vehicle_charges,
+                   driver_day_allowance, driver_night_allowance, model='geodesic', geodesic=None):
+    # Same formula as Trip.calculate_cost; every cost argument may be a scalar or a per-lane array
+    distances = distances_km(starts, ends, model, geodesic)
+    fuel_expense = distances * np.asarray(fuel_litres_per_km, dtype=float) * np.asarray(fuel_costs, dtype=float)
+    totals = (
+        fuel_expense +
+        np.asarray(driver_day_allowance, dtype=float) +
+        np.asarray(driver_night_allowance, dtype=float) +
+        np.asarray(daily_vehicle_charges, dtype=float)
+    )
+    return distances, np.broadcast_to(totals, distances.shape)
+
+
+def check_tolerance(starts, ends, distances, sample_size=50, tolerance_km=0.05):
+    # Re-measure a spread of lanes with geopy's geodesic(), the path Trip.calculate_distance takes
+    starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+    ends = np.asarray(ends, dtype=float).reshape(-1, 2)
+    if len(distances) == 0 or sample_size <= 0:
+        return {"checked": 0, "max_error_km": 0.0, "tolerance_km": tolerance_km, "within_tolerance": True}
+    picks = np.unique(np.linspace(0, len(distances) - 1, min(sample_size, len(distances))).astype(int))
+    metrics.GEODESIC_CALLS.inc(len(picks))
+    from geopy.distance import geodesic
+    errors = [abs(geodesic(tuple(starts[i]), tuple(ends[i])).km - float(distances[i])) for i in picks]
+    max_error = max(errors)
+    return {
+        "checked": len(picks),
+        "max_error_km": max_error,
+        "tolerance_km": tolerance_km,
+        "within_tolerance": max_error <= tolerance_km,
+    }
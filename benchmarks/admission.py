@@ -0,0 +1,170 @@
+# Admin latency while one client floods the public /client_request endpoint, with admission control
+# off and on. Each phase runs a fresh threaded server in its own process, so the load generator
+# does not compete with it for the interpreter. The flood is paced at --flood-rate, above what the
+# endpoint can serve, so the generator's own CPU use is the same in every phase.
+# Run from the repository root: python -m benchmarks.admission [--flood-rate 400] [--duration 10]
+import argparse
+import http.cookiejar
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+
+from benchmarks.suite import summarize
+from locations import LOCATIONS
+
+PHASES = [
+    # name, flood threads on?, environment for the server
+    ('admin only', False, {}),
+    ('flood, admission off', True, {'DRIVESYNC_PUBLIC_RATE': '0', 'DRIVESYNC_PUBLIC_CONCURRENCY': '0'}),
+    ('flood, admission on', True, {}),
+]
+
+
+def serve(port, accounts):
+    import app
+    from benchmarks import suite
+    from werkzeug.serving import make_server
+
+    logic = suite.fresh_logic()
+    suite.populate(logic, accounts, random.Random(1))
+    flask_app = app.create_app({'WTF_CSRF_ENABLED': False}, logic=logic)
+    # One log line per request would cost the server more than rejecting it does
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    make_server('127.0.0.1', port, flask_app, threaded=True).serve_forever()
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def start_server(accounts, env):
+    port = free_port()
+    process = subprocess.Popen([sys.executable, '-m', 'benchmarks.admission', '--serve', str(port),
+                                '--accounts', str(accounts)], env=dict(os.environ, **env))
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url + '/login', timeout=1):
+                return process, url
+        except (urllib.error.URLError, ConnectionError):
+            if process.poll() is not None:
+                raise RuntimeError('Server exited during start-up')
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError('Server did not start')
+
+
+def admin_opener(url):
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    form = urllib.parse.urlencode({'username': 'admin', 'password': 'admin123'}).encode()
+    opener.open(url + '/login', data=form, timeout=30).read()
+    return opener
+
+
+def run_phase(url, flood, admin_threads, flood_threads, flood_rate, duration):
+    admin_latencies = []
+    admin_errors = [0]
+    public = Counter()
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def admin(number):
+        opener = admin_opener(url)
+        paths = ['/', '/?requests_sort=cost&requests_order=desc', '/metrics']
+        local, failed = [], 0
+        while time.perf_counter() < deadline:
+            began = time.perf_counter()
+            try:
+                with opener.open(url + paths[len(local) % len(paths)], timeout=60) as response:
+                    response.read()
+            except Exception:
+                failed += 1
+            local.append(time.perf_counter() - began)
+        with lock:
+            admin_latencies.extend(local)
+            admin_errors[0] += failed
+
+    def flooder(number):
+        rng = random.Random(number)
+        local = Counter()
+        interval = flood_threads / flood_rate
+        next_at = time.perf_counter() + interval * number / flood_threads
+        while time.perf_counter() < deadline:
+            # Paced, but never bursting to catch up after a slow response
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            next_at = max(next_at + interval, time.perf_counter())
+            (start, _), (end, _) = rng.sample(LOCATIONS, 2)
+            form = urllib.parse.urlencode({
+                'name': 'Partner', 'email': f"partner{rng.randrange(50)}@example.com", 'contact': '0700000000',
+                'goods_description': 'pallets', 'pick_up_point': start, 'drop_off_point': end, 'comments': '',
+            }).encode()
+            try:
+                with urllib.request.urlopen(url + '/client_request', data=form, timeout=60) as response:
+                    response.read()
+                    local[response.status] += 1
+            except urllib.error.HTTPError as e:
+                local[e.code] += 1
+            except Exception:
+                local['error'] += 1
+        with lock:
+            public.update(local)
+
+    threads = [threading.Thread(target=admin, args=(n,)) for n in range(admin_threads)]
+    if flood:
+        threads += [threading.Thread(target=flooder, args=(n,)) for n in range(flood_threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return summarize(admin_latencies, elapsed), admin_errors[0], public, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark admin latency under a public endpoint flood.')
+    parser.add_argument('--admin-threads', type=int, default=2)
+    parser.add_argument('--flood-threads', type=int, default=32)
+    parser.add_argument('--flood-rate', type=float, default=400, help='Public requests per second offered')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--accounts', type=int, default=2000)
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.accounts)
+        return
+
+    for name, flood, env in PHASES:
+        process, url = start_server(args.accounts, env)
+        try:
+            admin, errors, public, elapsed = run_phase(url, flood, args.admin_threads, args.flood_threads,
+                                                      args.flood_rate, args.duration)
+        finally:
+            process.terminate()
+            process.wait()
+        print(f"{name}:")
+        print(f"  admin   p50 {admin['p50_ms']:8.1f} ms  p95 {admin['p95_ms']:8.1f} ms  p99 {admin['p99_ms']:8.1f} ms  "
+              f"{admin['ops_per_sec']:7.1f} req/s  errors {errors}")
+        if flood:
+            total = sum(public.values())
+            statuses = ', '.join(f"{status}: {count / elapsed:.0f}/s" for status, count in sorted(public.items(), key=str))
+            print(f"  public  {total / elapsed:7.1f} req/s ({statuses})")
+
+
+if __name__ == '__main__':
+    main()
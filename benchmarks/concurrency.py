@@ -0,0 +1,198 @@
+# Concurrent use of one DriveSyncApp: a stress test that checks for lost and duplicate records while
+# writers race each other and dashboard-style readers, and throughput runs at 1..N threads. The
+# CPU-bound run can't scale on a GIL build; the serving run adds --io-ms of waiting per operation,
+# standing in for a request's network I/O, which threads overlap unless a lock is held across it.
+# Exits with status 1 if the stress test finds an inconsistency.
+# Run from the repository root: python -m benchmarks.concurrency [--threads 8] [--storage sqlite] [--io-ms 2]
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from core import DriveSyncApp
+from locations import LOCATIONS
+from models import ClientRequest, Driver, Vehicle
+from pagination import ChainedSequence, paginate
+from storage import SQLiteStorage
+
+
+def make_logic(storage_kind, directory, drivers=20):
+    storage = SQLiteStorage(os.path.join(directory, f"bench-{time.monotonic_ns()}.db")) if storage_kind == 'sqlite' else None
+    logic = DriveSyncApp(storage=storage)
+    logic.distances.precompute(LOCATIONS)
+    logic.quote_distances.precompute(LOCATIONS)
+    for number in range(drivers):
+        vehicle = Vehicle('Van', f"UBC{number:04d}", 0.1, 50000)
+        logic.onboard_vehicle(vehicle)
+        driver = Driver(f"D{number:04d}", f"Driver {number}", f"driver{number}@example.com", '0700000000',
+                        'Van', vehicle.vehicle_reg_no, 10000, 15000)
+        driver.vehicle = vehicle
+        logic.add_account(driver)
+    return logic
+
+
+def request_for(email, rng):
+    (start_name, start), (end_name, end) = rng.sample(LOCATIONS, 2)
+    return ClientRequest('Bench', email, '0700000000', 'boxes', start, end, '',
+                         pick_up_name=start_name, drop_off_name=end_name)
+
+
+def run_threads(count, target):
+    errors = []
+
+    def guarded(number):
+        try:
+            target(number)
+        except Exception as e:
+            errors.append(f"thread {number}: {e!r}")
+
+    threads = [threading.Thread(target=guarded, args=(number,)) for number in range(count)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, errors
+
+
+def stress(logic, threads, operations, emails, seed):
+    # Writers draw from a small pool of emails so several threads try to create the same client at
+    # once; every fourth operation books a trip for a client that already exists
+    submitted = [0] * threads
+    booked = [0] * threads
+    done = threading.Event()
+    reader_errors = []
+
+    def writer(number):
+        rng = random.Random(seed + number)
+        for operation in range(operations):
+            if operation % 4 == 3 and len(logic.clients):
+                client = logic.clients[rng.randrange(len(logic.clients))]
+                driver = f"D{rng.randrange(len(logic.drivers)):04d}"
+                start, end = rng.sample(LOCATIONS, 2)
+                logic.process_trip(client.account_id, driver, start[1], end[1], 5000)
+                booked[number] += 1
+            else:
+                logic.add_client_request(request_for(f"client{rng.randrange(emails)}@example.com", rng))
+                submitted[number] += 1
+
+    def reader():
+        # What the dashboard does on every render, against collections that keep growing
+        while not done.is_set():
+            try:
+                paginate(logic.client_requests.snapshot(), 25, sort_key=lambda r: r.estimated_cost)
+                paginate(logic.trips.snapshot(), 25, sort_key=lambda t: t.total_cost, descending=True)
+                paginate(ChainedSequence(logic.drivers.snapshot(), logic.clients.snapshot()), 25)
+            except Exception as e:
+                reader_errors.append(repr(e))
+                return
+
+    readers = [threading.Thread(target=reader) for _ in range(2)]
+    for thread in readers:
+        thread.start()
+    elapsed, errors = run_threads(threads, writer)
+    done.set()
+    for thread in readers:
+        thread.join()
+
+    problems = errors + [f"reader: {error}" for error in reader_errors]
+    client_ids = [client.account_id for client in logic.clients]
+    client_emails = [client.email for client in logic.clients]
+    used_emails = {request.email for request in logic.client_requests}
+    if len(logic.client_requests) != sum(submitted):
+        problems.append(f"{sum(submitted)} client requests submitted, {len(logic.client_requests)} stored")
+    if len(set(client_ids)) != len(client_ids):
+        problems.append(f"{len(client_ids) - len(set(client_ids))} duplicate client ids")
+    if len(set(client_emails)) != len(client_emails):
+        problems.append(f"{len(client_emails) - len(set(client_emails))} clients share an email")
+    if set(client_emails) != used_emails:
+        problems.append(f"{len(used_emails)} distinct emails requested, {len(set(client_emails))} clients created")
+    mismatched = [r for r in logic.client_requests
+                  if getattr(logic.get_client(r.client_id), 'email', None) != r.email]
+    if mismatched:
+        problems.append(f"{len(mismatched)} requests point at the wrong client")
+    if len(logic.trips) != sum(booked):
+        problems.append(f"{sum(booked)} trips booked, {len(logic.trips)} stored")
+    recorded = logic.aggregates.overall.to_dict()['trip_count']
+    if recorded != sum(booked):
+        problems.append(f"{sum(booked)} trips booked, {recorded} in the aggregates")
+    return {
+        'elapsed': elapsed,
+        'requests': sum(submitted),
+        'trips': sum(booked),
+        'clients': len(client_ids),
+        'problems': problems,
+    }
+
+
+def throughput(storage_kind, directory, threads, operations, seed, io_wait=0.0):
+    # Existing clients only, so the run measures the steady-state request and booking paths
+    logic = make_logic(storage_kind, directory)
+    for number in range(200):
+        logic.add_client_request(request_for(f"client{number}@example.com", random.Random(number)))
+
+    def worker(number):
+        rng = random.Random(seed + number)
+        for operation in range(operations):
+            if io_wait:
+                time.sleep(io_wait)
+            if operation % 2:
+                start, end = rng.sample(LOCATIONS, 2)
+                logic.process_trip(f"C{rng.randrange(1, 201):03d}", f"D{rng.randrange(20):04d}", start[1], end[1], 5000)
+            else:
+                logic.add_client_request(request_for(f"client{rng.randrange(200)}@example.com", rng))
+
+    elapsed, errors = run_threads(threads, worker)
+    if errors:
+        raise RuntimeError(errors[0])
+    logic.storage.close()
+    return threads * operations / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stress and throughput test for concurrent DriveSyncApp use.')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--operations', type=int, default=2000, help='Operations per thread')
+    parser.add_argument('--emails', type=int, default=300, help='Distinct client emails in the stress test')
+    parser.add_argument('--storage', choices=('memory', 'sqlite'), default='sqlite')
+    parser.add_argument('--switch-interval', type=float, default=1e-6,
+                        help='sys.setswitchinterval during the stress test; tiny values force more interleaving')
+    parser.add_argument('--io-ms', type=float, default=2.0, help='Wait per operation in the serving run')
+    parser.add_argument('--repeat', type=int, default=3, help='Throughput runs per thread count; the best is reported')
+    parser.add_argument('--seed', type=int, default=11)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(args.switch_interval)
+        try:
+            result = stress(make_logic(args.storage, directory), args.threads, args.operations, args.emails, args.seed)
+        finally:
+            sys.setswitchinterval(interval)
+        print(f"stress: {args.threads} threads, {result['requests']} requests, {result['trips']} trips, "
+              f"{result['clients']} clients in {result['elapsed']:.2f} s")
+        for problem in result['problems']:
+            print(f"  FAIL {problem}")
+        if not result['problems']:
+            print("  no lost or duplicate records")
+
+        counts = sorted({1, 2, 4, args.threads})
+        runs = (('CPU-bound', max(args.operations // 4, 50), 0.0),
+                (f"serving, {args.io_ms:g} ms I/O per operation", max(args.operations // 20, 20), args.io_ms / 1000))
+        for label, operations, io_wait in runs:
+            print(f"throughput, {label} ({args.storage} storage, ops/sec):")
+            baseline = None
+            for threads in counts:
+                rate = max(throughput(args.storage, directory, threads, operations, args.seed, io_wait)
+                           for _ in range(args.repeat))
+                baseline = baseline or rate
+                print(f"  {threads:>3} threads  {rate:>10,.0f}  x{rate / baseline:.2f}")
+    if result['problems']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# Nearest-driver dispatch: spatial grid vs. a brute-force geodesic scan over every driver.
+# Run from the repository root: python -m benchmarks.dispatch [--drivers 10000]
+import argparse
+import random
+import time
+
+from geopy.distance import geodesic
+
+from dispatch import DispatchEngine, haversine_km
+from models import Driver
+
+# Rough bounding box of Uganda, the area LOCATIONS in locations.py covers
+LAT_RANGE = (-1.5, 4.2)
+LON_RANGE = (29.5, 35.0)
+VEHICLE_TYPES = ('Car', 'Van', 'Truck', 'Bus')
+
+
+def make_drivers(count, rng):
+    drivers = []
+    for number in range(count):
+        driver = Driver(f"D{number:05d}", f"Driver {number}", f"driver{number}@example.com", "0700000000",
+                        rng.choice(VEHICLE_TYPES), None, 10000, 15000)
+        driver.position = (rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE))
+        driver.available = rng.random() < 0.8
+        drivers.append(driver)
+    return drivers
+
+
+def brute_force(drivers, point, k, distance):
+    candidates = [d for d in drivers if d.available and d.vehicle_type == 'Truck']
+    return sorted(candidates, key=lambda d: distance(point, d.position))[:k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark nearest-driver dispatch.')
+    parser.add_argument('--drivers', type=int, default=10000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--brute-force-queries', type=int, default=20)
+    parser.add_argument('-k', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    drivers = make_drivers(args.drivers, rng)
+    engine = DispatchEngine()
+    started = time.perf_counter()
+    for driver in drivers:
+        engine.update(driver)
+    build_seconds = time.perf_counter() - started
+
+    points = [(rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)) for _ in range(args.queries)]
+    started = time.perf_counter()
+    results = [engine.nearest(point, k=args.k, vehicle_type='Truck') for point in points]
+    grid_ms = (time.perf_counter() - started) / len(points) * 1000
+
+    # Same metric as the grid, so the answers must match exactly
+    def haversine(a, b):
+        return haversine_km(a[0], a[1], b[0], b[1])
+    mismatches = sum(
+        [d.account_id for d, _ in result] != [d.account_id for d in brute_force(drivers, point, args.k, haversine)]
+        for point, result in zip(points, results)
+    )
+
+    sample = points[:args.brute_force_queries]
+    started = time.perf_counter()
+    geodesic_results = [brute_force(drivers, point, args.k, lambda a, b: geodesic(a, b).km) for point in sample]
+    brute_ms = (time.perf_counter() - started) / len(sample) * 1000
+    agreement = sum(
+        len({d.account_id for d, _ in result} & {d.account_id for d in expected})
+        for result, expected in zip(results, geodesic_results)
+    ) / (len(sample) * args.k)
+
+    print(f"drivers indexed:            {engine.available_count()} of {len(drivers)} (build {build_seconds * 1000:.1f} ms)")
+    print(f"grid k-nearest (k={args.k}):      {grid_ms:.3f} ms/query over {len(points)} queries")
+    print(f"brute-force geodesic scan:  {brute_ms:.3f} ms/query over {len(sample)} queries")
+    print(f"speedup:                    {brute_ms / grid_ms:,.0f}x")
+    print(f"mismatches vs haversine scan: {mismatches}")
+    print(f"overlap with geodesic ranking: {agreement:.1%}")
+
+
+if __name__ == '__main__':
+    main()
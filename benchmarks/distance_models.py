@@ -0,0 +1,77 @@
+# Speed and worst-case error of each distance model against geopy's geodesic() over the Uganda
+# bounding box. Exits with status 1 if a model exceeds its documented bound in distance.MAX_ERROR.
+# Run from the repository root: python -m benchmarks.distance_models [--pairs 20000]
+import argparse
+import random
+import sys
+import time
+
+from geopy.distance import geodesic
+
+from distance import DISTANCE_MODELS, MAX_ERROR, UGANDA_BOUNDS
+
+
+def random_pairs(count, rng):
+    (south, west), (north, east) = UGANDA_BOUNDS
+    pairs = []
+    for number in range(count):
+        start = (rng.uniform(south, north), rng.uniform(west, east))
+        if number % 2:
+            # Half the pairs are short hops, where relative error matters most
+            end = (start[0] + rng.uniform(-0.05, 0.05), start[1] + rng.uniform(-0.05, 0.05))
+        else:
+            end = (rng.uniform(south, north), rng.uniform(west, east))
+        pairs.append((start, end))
+    # The box's edges and diagonals are the longest lines, where the approximations drift furthest
+    pairs += [
+        ((south, west), (north, east)), ((south, east), (north, west)),
+        ((south, west), (north, west)), ((south, east), (north, east)),
+        ((south, west), (south, east)), ((north, west), (north, east)),
+    ]
+    return pairs
+
+
+def time_model(measure, pairs, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for start, end in pairs:
+            measure(start, end)
+        best = min(best, time.perf_counter() - started)
+    return best / len(pairs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark distance models against geodesic().')
+    parser.add_argument('--pairs', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=3)
+    args = parser.parse_args()
+
+    pairs = random_pairs(args.pairs, random.Random(args.seed))
+    reference = [geodesic(start, end).km for start, end in pairs]
+    baseline = time_model(lambda start, end: geodesic(start, end).km, pairs, args.repeat)
+
+    failed = []
+    print(f"{'model':16s} {'us/call':>9s} {'speedup':>9s} {'max km':>9s} {'max rel':>9s} {'bound':>17s}")
+    for name, measure in DISTANCE_MODELS.items():
+        per_call = time_model(measure, pairs, args.repeat)
+        max_km = max_rel = 0.0
+        for (start, end), expected in zip(pairs, reference):
+            error = abs(measure(start, end) - expected)
+            max_km = max(max_km, error)
+            if expected > 0.001:
+                max_rel = max(max_rel, error / expected)
+        bound_km, bound_rel = MAX_ERROR[name]
+        ok = max_km <= bound_km + 1e-9 and max_rel <= bound_rel + 1e-12
+        if not ok:
+            failed.append(name)
+        print(f"{name:16s} {per_call * 1e6:9.2f} {baseline / per_call:8.1f}x {max_km:9.4f} {max_rel:9.5%} "
+              f"{bound_km:6.1f} km {bound_rel:6.2%} {'' if ok else 'EXCEEDED'}")
+    if failed:
+        print(f"error bound exceeded: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
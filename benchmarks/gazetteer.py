@@ -0,0 +1,102 @@
+# Autocomplete and reverse lookups against a gazetteer of --places synthetic names (or a real file
+# given with --file, CSV or a GeoNames extract). Every prefix of a sample of names is searched as if
+# typed one key at a time, through the trie and through a linear scan of every name.
+# Run from the repository root: python -m benchmarks.gazetteer [--places 50000] [--file UG.txt]
+import argparse
+import random
+import time
+
+from benchmarks.suite import summarize
+from locations import Gazetteer, Place, normalize
+
+SYLLABLES = ['ka', 'ki', 'bu', 'mu', 'na', 'lu', 'ma', 'ru', 'ga', 'se', 'to', 'wa', 'ny', 'ko', 'li', 'be']
+
+
+def synthetic_places(count, rng):
+    places = []
+    for number in range(count):
+        words = [''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title()
+                 for _ in range(rng.choice((1, 1, 1, 2)))]
+        places.append(Place(f"{' '.join(words)} {number}", rng.uniform(-1.4, 4.2), rng.uniform(29.6, 35.0),
+                            rng.choice(('town', 'town', 'town', 'landmark')), rng.randrange(100000)))
+    return places
+
+
+def keystrokes(names, count, rng):
+    typed = []
+    for name in rng.sample(names, min(count, len(names))):
+        typed.extend(name[:length] for length in range(1, min(len(name), 12) + 1))
+    return typed
+
+
+def scan_index(places):
+    # The best a plain list can do: names normalised once, every word start checked per query
+    index = []
+    for place in places:
+        words = normalize(place.name).split(' ')
+        index.append(([' '.join(words[start:]) for start in range(len(words))], place))
+    return index
+
+
+def linear_search(index, query, limit=10):
+    key = normalize(query)
+    matches = [place for keys, place in index if any(k.startswith(key) for k in keys)]
+    return sorted(matches, key=lambda p: p.rank)[:limit]
+
+
+def timed(fn, arguments):
+    latencies = []
+    started = time.perf_counter()
+    for argument in arguments:
+        began = time.perf_counter()
+        fn(argument)
+        latencies.append(time.perf_counter() - began)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def report(label, result):
+    print(f"  {label:<24} p50 {result['p50_ms']:8.4f} ms  p99 {result['p99_ms']:8.4f} ms  {result['ops_per_sec']:>12,.0f}/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark gazetteer autocomplete and reverse lookups.')
+    parser.add_argument('--places', type=int, default=50000)
+    parser.add_argument('--file', help='Load this gazetteer instead of generating one')
+    parser.add_argument('--names', type=int, default=500, help='Names typed one key at a time')
+    parser.add_argument('--scan-names', type=int, default=20, help='Names typed against the linear scan')
+    parser.add_argument('--lookups', type=int, default=50000, help='Reverse lookups, over 1000 distinct points')
+    parser.add_argument('--seed', type=int, default=9)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    if args.file:
+        gazetteer = Gazetteer.load(args.file)
+    else:
+        gazetteer = Gazetteer(synthetic_places(args.places, rng))
+    load_seconds = time.perf_counter() - started
+    places = list(gazetteer)
+    names = [place.name for place in places]
+    print(f"gazetteer: {len(gazetteer):,} places, {len(gazetteer._trie):,} trie nodes, loaded in {load_seconds:.2f} s")
+
+    print("autocomplete, per keystroke:")
+    report('trie', timed(gazetteer.search, keystrokes(names, args.names, rng)))
+    index = scan_index(places)
+    report('linear scan', timed(lambda query: linear_search(index, query), keystrokes(names, args.scan_names, rng)))
+
+    print("exact name to coordinates:")
+    report('hash index', timed(gazetteer.coords, rng.choices(names, k=args.lookups)))
+
+    # Trip end points repeat, so the dashboard asks about the same few coordinates again and again
+    points = [(p.latitude, p.longitude) for p in rng.sample(places, min(1000, len(places)))]
+    points += [(rng.uniform(-1.4, 4.2), rng.uniform(29.6, 35.0)) for _ in range(len(points))]
+    lookups = rng.choices(points, k=args.lookups)
+    print("coordinates to name:")
+    report('spatial grid', timed(gazetteer._name_near, lookups))
+    report('memoized', timed(gazetteer.label, lookups))
+    info = gazetteer.name_near.cache_info()
+    print(f"  cache hits {info.hits:,}, misses {info.misses:,}")
+
+
+if __name__ == '__main__':
+    main()
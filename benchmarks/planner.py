@@ -0,0 +1,67 @@
+# Consolidation planner over pending client requests, against pricing every request as its own trip.
+# Run from the repository root: python -m benchmarks.planner [--requests 1000]
+import argparse
+import random
+import time
+
+import app
+from core import DriveSyncApp
+from models import ClientRequest, Driver, Vehicle
+from planner import distance_matrix
+
+
+def make_requests(count, rng, hubs):
+    requests = []
+    for number in range(count):
+        # Most loads leave a few hubs; drop-offs are jittered around the known towns
+        pick_up_name, pick_up = rng.choice(hubs) if rng.random() < 0.8 else rng.choice(app.LOCATIONS)
+        drop_off_name, drop_off = rng.choice([loc for loc in app.LOCATIONS if loc[0] != pick_up_name])
+        drop_off = (drop_off[0] + rng.uniform(-0.2, 0.2), drop_off[1] + rng.uniform(-0.2, 0.2))
+        requests.append(ClientRequest(f"Client {number}", f"client{number}@example.com", '0700000000', 'boxes',
+                                      pick_up, drop_off, '', client_id=f"C{number:05d}",
+                                      pick_up_name=pick_up_name, drop_off_name=drop_off_name))
+    return requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the multi-stop consolidation planner.')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--drivers', type=int, default=100)
+    parser.add_argument('--max-stops', type=int, default=6)
+    parser.add_argument('--seed', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    logic = DriveSyncApp()
+    for number in range(args.drivers):
+        vehicle = Vehicle(rng.choice(('Van', 'Truck')), f"UBP{number:04d}", rng.uniform(0.08, 0.2),
+                          rng.choice((40000, 50000, 70000)))
+        logic.onboard_vehicle(vehicle)
+        driver = Driver(f"D{number:04d}", f"Driver {number}", f"driver{number}@example.com", '0700000000',
+                        vehicle.vehicle_type, vehicle.vehicle_reg_no, 10000, 15000)
+        driver.vehicle = vehicle
+        logic.add_account(driver)
+    for request in make_requests(args.requests, rng, app.LOCATIONS[:3]):
+        logic.client_requests.add(request)
+
+    points = {tuple(p) for r in logic.client_requests for p in (r.pick_up_point, r.drop_off_point)}
+    started = time.perf_counter()
+    distance_matrix(sorted(points))
+    matrix_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    plan = logic.plan_consolidation(max_stops=args.max_stops)
+    plan_seconds = time.perf_counter() - started
+
+    stops = [len(route.requests) for route in plan.routes]
+    print(f"pending requests:   {len(logic.pending_requests())} ({len(points)} distinct points)")
+    print(f"distance matrix:    {matrix_seconds:.3f} s")
+    print(f"plan:               {plan_seconds:.3f} s (matrix included)")
+    print(f"routes:             {len(plan.routes)} (avg {sum(stops) / len(stops):.2f} stops, max {max(stops)})")
+    print(f"separate trips:     UGX {plan.separate_cost:,.0f}")
+    print(f"consolidated:       UGX {plan.total_cost:,.0f}")
+    print(f"savings:            UGX {plan.savings:,.0f} ({plan.savings / plan.separate_cost:.1%})")
+
+
+if __name__ == '__main__':
+    main()
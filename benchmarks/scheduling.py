@@ -0,0 +1,160 @@
+# Booking calendar at --trips scheduled trips: booking through process_trip, then conflict checks,
+# "who is free between T1 and T2" and the vehicle utilisation report, each against a scan of every
+# booking. Exits with status 1 if the calendar and the scan disagree.
+# Run from the repository root: python -m benchmarks.scheduling [--trips 100000] [--vehicles 500]
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.suite import summarize
+from core import DriveSyncApp
+from locations import LOCATIONS
+from models import Client, Driver, Vehicle
+
+EPOCH = datetime(2026, 1, 1)
+
+
+def make_logic(vehicles):
+    logic = DriveSyncApp()
+    logic.distances.precompute(LOCATIONS)
+    for number in range(vehicles):
+        vehicle = Vehicle('Van', f"UBS{number:04d}", 0.1, 50000)
+        logic.onboard_vehicle(vehicle)
+        driver = Driver(f"D{number:04d}", f"Driver {number}", f"driver{number}@example.com", '0700000000',
+                        'Van', vehicle.vehicle_reg_no, 10000, 15000)
+        driver.vehicle = vehicle
+        logic.add_account(driver)
+    logic.add_account(Client('C001', 'Bench', 'bench@example.com', '0700000000'))
+    return logic
+
+
+def make_bookings(trips, vehicles, rng):
+    # Back-to-back trips of 2 to 10 hours with gaps, one vehicle after another, then shuffled so
+    # the calendar sees them out of order
+    per_vehicle = -(-trips // vehicles)
+    bookings = []
+    for number in range(vehicles):
+        at = EPOCH + timedelta(hours=rng.uniform(0, 24))
+        for _ in range(min(per_vehicle, trips - len(bookings))):
+            ends_at = at + timedelta(hours=rng.uniform(2, 10))
+            bookings.append((f"D{number:04d}", at, ends_at))
+            at = ends_at + timedelta(hours=rng.uniform(0.5, 48))
+    rng.shuffle(bookings)
+    return bookings
+
+
+def timed(fn, arguments):
+    results, latencies = [], []
+    started = time.perf_counter()
+    for argument in arguments:
+        began = time.perf_counter()
+        results.append(fn(*argument))
+        latencies.append(time.perf_counter() - began)
+    return results, summarize(latencies, time.perf_counter() - started)
+
+
+def report(label, result):
+    print(f"  {label:<12} p50 {result['p50_ms']:9.4f} ms  p99 {result['p99_ms']:9.4f} ms  {result['ops_per_sec']:>10,.0f}/s")
+
+
+def random_windows(count, span_days, hours, rng):
+    windows = []
+    for _ in range(count):
+        starts_at = EPOCH + timedelta(hours=rng.uniform(0, span_days * 24))
+        windows.append((starts_at, starts_at + timedelta(hours=hours)))
+    return windows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the driver and vehicle booking calendar.')
+    parser.add_argument('--trips', type=int, default=100000)
+    parser.add_argument('--vehicles', type=int, default=500)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--scan-queries', type=int, default=20, help='Queries answered by scanning every booking')
+    parser.add_argument('--seed', type=int, default=21)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    logic = make_logic(args.vehicles)
+    bookings = make_bookings(args.trips, args.vehicles, rng)
+    start, end = LOCATIONS[0][1], LOCATIONS[2][1]
+    results, booking = timed(lambda driver_id, starts_at, ends_at: logic.process_trip(
+        'C001', driver_id, start, end, 5000, starts_at=starts_at, ends_at=ends_at), bookings)
+    rejected = sum('⚠️' in result for result in results)
+    span_days = (max(ends_at for _, _, ends_at in bookings) - EPOCH).days
+    print(f"{len(logic.trips):,} scheduled trips on {args.vehicles} drivers and vehicles over {span_days} days "
+          f"({rejected} rejected)")
+    print("booking (process_trip):")
+    report('calendar', booking)
+
+    # The scan baseline: every booking as a plain tuple, which is already cheaper than reading trips
+    scan = [(driver_id, starts_at.timestamp(), ends_at.timestamp()) for driver_id, starts_at, ends_at in bookings]
+    problems = []
+
+    def scan_conflicts(driver_id, starts_at, ends_at):
+        start, end = starts_at.timestamp(), ends_at.timestamp()
+        return sorted((s, e) for d, s, e in scan if d == driver_id and s < end and e > start)
+
+    def calendar_conflicts(driver_id, starts_at, ends_at):
+        return [(s, e) for s, e, _ in logic.driver_calendar.bookings(driver_id, starts_at.timestamp(), ends_at.timestamp())]
+
+    checks = [(f"D{rng.randrange(args.vehicles):04d}", *window) for window in random_windows(args.queries, span_days, 6, rng)]
+    print("conflict check, one driver, 6 hour window:")
+    found, result = timed(calendar_conflicts, checks)
+    report('calendar', result)
+    expected, result = timed(scan_conflicts, checks[:args.scan_queries])
+    report('scan', result)
+    if found[:args.scan_queries] != expected:
+        problems.append('conflict checks differ from the scan')
+    print(f"  {sum(bool(f) for f in found) / len(found):.0%} of checks found a conflict")
+
+    def scan_free(starts_at, ends_at):
+        start, end = starts_at.timestamp(), ends_at.timestamp()
+        busy = {d for d, s, e in scan if s < end and e > start}
+        return [driver.account_id for driver in logic.drivers if driver.account_id not in busy]
+
+    def calendar_free(starts_at, ends_at):
+        return [driver.account_id for driver in logic.free_drivers(starts_at, ends_at)]
+
+    windows = random_windows(args.queries, span_days, 4, rng)
+    print("free drivers, 4 hour window:")
+    found, result = timed(calendar_free, windows)
+    report('calendar', result)
+    expected, result = timed(scan_free, windows[:args.scan_queries])
+    report('scan', result)
+    if found[:args.scan_queries] != expected:
+        problems.append('free driver queries differ from the scan')
+
+    def scan_utilization(starts_at, ends_at):
+        start, end = starts_at.timestamp(), ends_at.timestamp()
+        booked = {}
+        for d, s, e in scan:
+            if s < end and e > start:
+                booked[d] = booked.get(d, 0) + min(e, end) - max(s, start)
+        return [round(booked.get(driver.account_id, 0) / 3600, 2) for driver in logic.drivers]
+
+    def calendar_utilization(starts_at, ends_at):
+        return [vehicle['booked_hours'] for vehicle in logic.vehicle_utilization(starts_at, ends_at)]
+
+    # The report reads every booking in the window, so over long windows it is bound by how many
+    # there are rather than by the search
+    for days in (1, 30):
+        windows = random_windows(max(args.scan_queries, 5), max(span_days - days, 1), days * 24, rng)
+        print(f"utilisation report, {args.vehicles} vehicles, {days} day window:")
+        found, result = timed(calendar_utilization, windows)
+        report('calendar', result)
+        expected, result = timed(scan_utilization, windows[:args.scan_queries])
+        report('scan', result)
+        if found[:args.scan_queries] != expected:
+            problems.append(f"{days} day utilisation differs from the scan")
+
+    for problem in problems:
+        print(f"FAIL {problem}")
+    if problems or rejected:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
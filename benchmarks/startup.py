@@ -0,0 +1,102 @@
+# Cold start of the web app: import time, app creation and the first vs second request to a few
+# routes, each measured in a fresh interpreter. --tree may be given more than once to compare
+# checkouts, e.g. against the previous release:
+#   git worktree add /tmp/before <ref>
+#   python -m benchmarks.startup --tree /tmp/before --tree .
+# Trees without create_app() are measured through the module-level flask_app instead.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Public pages first: /login redirects once the admin session is set
+PATHS = ['/client_request', '/login', '/', '/process_trip']
+ADMIN_PATHS = {'/', '/process_trip'}
+
+CHILD = '''
+import json, sys, time
+options = json.loads(sys.argv[1])
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+flask_app = app.create_app(warm=options['warm']) if hasattr(app, 'create_app') else app.flask_app
+created = time.perf_counter()
+client = flask_app.test_client()
+requests = {}
+for path in options['paths']:
+    if path in options['admin_paths']:
+        with client.session_transaction() as session:
+            session['admin_logged_in'] = True
+    timings = []
+    for _ in range(2):
+        began = time.perf_counter()
+        response = client.get(path)
+        response.get_data()
+        timings.append((time.perf_counter() - began) * 1000)
+        if response.status_code != 200:
+            raise SystemExit(f"GET {path} returned {response.status_code}")
+    requests[path] = timings
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_ms': (created - imported) * 1000,
+    'requests': requests,
+    'factory': hasattr(app, 'create_app'),
+}))
+'''
+
+
+def run_once(tree, warm, template_cache):
+    env = dict(os.environ, DRIVESYNC_TEMPLATE_CACHE=template_cache)
+    env.pop('DRIVESYNC_DATABASE', None)
+    options = json.dumps({'warm': warm, 'paths': PATHS, 'admin_paths': sorted(ADMIN_PATHS)})
+    process = subprocess.run([sys.executable, '-c', CHILD, options], cwd=tree, env=env, capture_output=True, text=True)
+    if process.returncode:
+        raise RuntimeError(f"{tree}: {process.stderr.strip().splitlines()[-1]}")
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def median_of(runs):
+    return {
+        'import_ms': round(statistics.median(r['import_ms'] for r in runs), 1),
+        'create_ms': round(statistics.median(r['create_ms'] for r in runs), 1),
+        'first_request_ms': {path: round(statistics.median(r['requests'][path][0] for r in runs), 2) for path in PATHS},
+        'second_request_ms': {path: round(statistics.median(r['requests'][path][1] for r in runs), 2) for path in PATHS},
+    }
+
+
+def measure_tree(tree, repeat):
+    results = {}
+    for warm in (False, True):
+        for cache in ('cold', 'warm'):
+            runs = []
+            for _ in range(repeat):
+                with tempfile.TemporaryDirectory() as template_cache:
+                    if cache == 'warm':
+                        # A previous process fills the bytecode cache, as after a worker restart
+                        run_once(tree, warm, template_cache)
+                    runs.append(run_once(tree, warm, template_cache))
+            results[f"{'warm_up' if warm else 'lazy'}_{cache}_template_cache"] = median_of(runs)
+            if not runs[0]['factory']:
+                # Without create_app() the variants are all the same process start
+                return {'module_level_app': results.popitem()[1]}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark web app cold start.')
+    parser.add_argument('--tree', action='append', help='Checkout to measure (default: current directory)')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    results = {}
+    for tree in args.tree or ['.']:
+        print(f"measuring {tree}...", file=sys.stderr)
+        results[tree] = measure_tree(os.path.abspath(tree), args.repeat)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
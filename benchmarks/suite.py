@@ -0,0 +1,282 @@
+# Benchmarks for trip costing, booking and the dashboard routes, plus a concurrent load driver.
+# Run from the repository root:
+#   python -m benchmarks.suite --output bench.json
+#   python -m benchmarks.suite --output new.json --baseline bench.json
+#   python -m benchmarks.suite --load-only --url http://127.0.0.1:5000 --threads 16
+import argparse
+import json
+import platform
+import random
+import sys
+import threading
+import time
+import urllib.request
+from datetime import datetime
+
+import app
+from core import DriveSyncApp
+from models import Vehicle, Driver, Client, Trip, ClientRequest
+
+LOCATION_NAMES = [name for name, _ in app.LOCATIONS]
+flask_app = None
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(latencies, elapsed):
+    ordered = sorted(latencies)
+    return {
+        'count': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 4) if ordered else 0.0,
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 4),
+        'p95_ms': round(percentile(ordered, 0.95) * 1000, 4),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 4),
+        'ops_per_sec': round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def measure(fn, iterations):
+    latencies = []
+    started = time.perf_counter()
+    for number in range(iterations):
+        began = time.perf_counter()
+        fn(number)
+        latencies.append(time.perf_counter() - began)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def populate(logic, accounts, rng):
+    # accounts clients, one driver (with a vehicle) per ten clients, one trip per client
+    for number in range(max(accounts // 10, 1)):
+        vehicle = Vehicle('Van', f"UBX{number:06d}", 0.1, 50000)
+        logic.onboard_vehicle(vehicle)
+        driver = Driver(f"D{number:06d}", f"Driver {number}", f"driver{number}@example.com", '0700000000',
+                        'Van', vehicle.vehicle_reg_no, 10000, 15000)
+        driver.vehicle = vehicle
+        logic.add_account(driver)
+    for number in range(accounts):
+        logic.add_account(Client(f"C{number:06d}", f"Client {number}", f"client{number}@example.com", '0700000000'))
+    drivers = len(logic.drivers)
+    for number in range(accounts):
+        start, end = rng.sample(app.LOCATIONS, 2)
+        logic.process_trip(f"C{number:06d}", f"D{number % drivers:06d}", start[1], end[1], 5000)
+
+
+def fresh_logic():
+    logic = DriveSyncApp()
+    logic.distances.precompute(app.LOCATIONS)
+    logic.quote_distances.precompute(app.LOCATIONS)
+    return logic
+
+
+def bench_trip(iterations, rng):
+    vehicle = Vehicle('Van', 'BENCH001', 0.1, 50000)
+    driver = Driver('D000', 'Bench', 'bench@example.com', '0', 'Van', 'BENCH001', 10000, 15000)
+    driver.vehicle = vehicle
+    pairs = [tuple(point for _, point in rng.sample(app.LOCATIONS, 2)) for _ in range(iterations)]
+    logic = fresh_logic()
+    # Trips are costed lazily, so each one is read to time the distance and cost, not just the constructor
+    results = {
+        'trip_geodesic': measure(lambda n: Trip(pairs[n][0], pairs[n][1], 5000, vehicle, driver).total_cost, iterations),
+        'trip_distance_matrix': measure(
+            lambda n: Trip(pairs[n][0], pairs[n][1], 5000, vehicle, driver, distance_service=logic.distances).total_cost,
+            iterations
+        ),
+    }
+    # A new trip per call, built untimed, so nothing is served from the previous call's cache
+    trips = [Trip(start, end, 5000, vehicle, driver, distance_service=logic.distances) for start, end in pairs]
+    results['calculate_cost'] = measure(lambda n: trips[n].calculate_cost(), iterations)
+    return results
+
+
+def bench_core(size, iterations, rng):
+    logic = fresh_logic()
+    started = time.perf_counter()
+    populate(logic, size, rng)
+    results = {'populate_seconds': round(time.perf_counter() - started, 3)}
+
+    def add_request(number):
+        start, end = rng.sample(app.LOCATIONS, 2)
+        logic.add_client_request(ClientRequest(
+            'Bench', f"client{rng.randrange(size * 2)}@example.com", '0700000000', 'boxes', start[1], end[1], ''
+        ))
+
+    def process(number):
+        start, end = rng.sample(app.LOCATIONS, 2)
+        logic.process_trip(f"C{rng.randrange(size):06d}", f"D{rng.randrange(len(logic.drivers)):06d}", start[1], end[1], 5000)
+
+    results['add_client_request'] = measure(add_request, iterations)
+    results['process_trip'] = measure(process, iterations)
+    return results
+
+
+def serve(logic):
+    # Later admin_client() calls talk to an app built around this DriveSyncApp
+    global flask_app
+    # Admission control off: the load test drives public pages from one address on purpose
+    flask_app = app.create_app({'WTF_CSRF_ENABLED': False, 'PUBLIC_RATE_LIMIT': 0, 'PUBLIC_CONCURRENCY': 0},
+                               logic=logic, warm=False)
+
+
+def admin_client():
+    client = flask_app.test_client()
+    with client.session_transaction() as session:
+        session['admin_logged_in'] = True
+    return client
+
+
+def bench_routes(size, iterations, rng):
+    logic = fresh_logic()
+    populate(logic, size, rng)
+    serve(logic)
+    client = admin_client()
+
+    def get(path):
+        response = client.get(path)
+        response.get_data()  # drain streamed responses so the whole render is timed
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {path} returned {response.status_code}")
+
+    def post_request(number):
+        start, end = rng.sample(LOCATION_NAMES, 2)
+        response = client.post('/client_request', data={
+            'name': 'Bench', 'email': f"client{rng.randrange(size * 2)}@example.com", 'contact': '0700000000',
+            'goods_description': 'boxes', 'pick_up_point': start, 'drop_off_point': end, 'comments': ''
+        })
+        if response.status_code != 200:
+            raise RuntimeError(f"POST /client_request returned {response.status_code}")
+
+    return {
+        'home': measure(lambda n: get('/'), iterations),
+        'home_stream': measure(lambda n: get('/?stream=1'), iterations),
+        'history': measure(lambda n: get(f"/history/C{rng.randrange(size):06d}"), iterations),
+        'client_request': measure(post_request, iterations),
+    }
+
+
+def load_test(paths, threads, duration, url=None):
+    # Each worker loops over paths until the deadline; with url set it goes over real HTTP
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        client = None if url else admin_client()
+        local, failed = [], 0
+        while time.perf_counter() < deadline:
+            for path in paths:
+                began = time.perf_counter()
+                try:
+                    if url:
+                        with urllib.request.urlopen(url.rstrip('/') + path, timeout=30) as response:
+                            response.read()
+                            ok = response.status == 200
+                    else:
+                        response = client.get(path)
+                        response.get_data()
+                        ok = response.status_code == 200
+                except Exception:
+                    ok = False
+                local.append(time.perf_counter() - began)
+                failed += not ok
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    result = summarize(latencies, time.perf_counter() - started)
+    result.update({'threads': threads, 'errors': errors[0], 'paths': paths})
+    return result
+
+
+def flatten(results, prefix=''):
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from flatten(value, name)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+def compare(results, baseline, tolerance):
+    # Latencies regress when they grow, throughput when it shrinks
+    regressions = []
+    current = dict(flatten(results['benchmarks']))
+    for name, old in flatten(baseline['benchmarks']):
+        new = current.get(name)
+        if new is None or not old:
+            continue
+        if name.endswith('_ms') or name.endswith('_seconds'):
+            change = (new - old) / old
+        elif name.endswith('ops_per_sec'):
+            change = (old - new) / old
+        else:
+            continue
+        marker = 'REGRESSION' if change > tolerance else ''
+        print(f"{name:55s} {old:>12.3f} -> {new:>12.3f} ({change:+.1%}) {marker}")
+        if marker:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='DriveSync benchmark and load-test suite.')
+    parser.add_argument('--sizes', default='1000,10000,100000', help='comma separated registry sizes (accounts)')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds of concurrent load')
+    parser.add_argument('--url', help='run the load test against a live server instead of the test client')
+    parser.add_argument('--load-only', action='store_true')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='compare against a previous --output file')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative slowdown before flagging')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    benchmarks = {}
+    if not args.load_only:
+        benchmarks['trip'] = bench_trip(args.iterations, rng)
+        for size in sizes:
+            print(f"registry size {size}...", file=sys.stderr)
+            benchmarks[f"core_{size}"] = bench_core(size, args.iterations, rng)
+            benchmarks[f"routes_{size}"] = bench_routes(size, args.iterations, rng)
+    elif not args.url:
+        logic = fresh_logic()
+        populate(logic, sizes[0], rng)
+        serve(logic)
+    benchmarks['load'] = load_test(['/', f"/history/C{0:06d}", '/client_request'], args.threads, args.duration, url=args.url)
+
+    results = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'arguments': vars(args),
+        'benchmarks': benchmarks,
+    }
+    print(json.dumps(benchmarks, indent=2))
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(results, handle, indent=2)
+    if args.baseline:
+        with open(args.baseline) as handle:
+            regressions = compare(results, json.load(handle), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,63 @@
+import logging
+import threading
+from collections import defaultdict
+from contextlib import nullcontext
+from datetime import datetime
+from itertools import chain
 from models import Vehicle, Driver, Client, Trip, Account, ClientRequest
+from registry import IndexedCollection, IdAllocator, DuplicateRecordError
+from distance import DistanceService
+from storage import MemoryStorage, BookingConflict
+from jobs import QueueFull
+from dispatch import DispatchEngine
+from stats import TripAggregates
+from trip_store import TripStore
+from fuel import FuelPriceTable
+from scheduling import BookingCalendar, local_time
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FUEL_COST = 5000
+
+class BacklogFull(Exception):
+    pass
+
+@metrics.timed('estimate_cost')
+def estimate_cost(start, end, fuel_cost, vehicle, driver, distance_service=None):
+    # Module level so it can be shipped to a process pool
+    return Trip(start, end, fuel_cost, vehicle, driver, distance_service=distance_service).total_cost
 
 class DriveSyncApp:
-    def __init__(self):
-        self.drivers = []
-        self.clients = []
-        self.vehicles = []
-        self.trips = []
-        self.client_requests = []
+    def __init__(self, storage=None, jobs=None, trip_spill_path=None,
+                 quote_distance_model='equirectangular', trip_distance_model='geodesic', max_client_requests=None):
+        self.drivers = IndexedCollection(unique=('account_id', 'email'))
+        self.clients = IndexedCollection(unique=('account_id', 'email'))
+        self.vehicles = IndexedCollection(unique=('vehicle_reg_no',))
+        # Trips are kept column-wise; self.trips hands out lightweight TripView rows
+        self.trips = TripStore(spill_path=trip_spill_path)
+        # job_id finds a request from its queued estimate, for the confirmation page to poll
+        self.client_requests = IndexedCollection(unique=('job_id', 'request_id'))
+        # Closed requests stay listed; the backlog cap counts the rest
+        self._closed_requests = 0
+        # Ceiling on client requests held in memory; new submissions are refused beyond it (racing
+        # submissions can overshoot it by one each, which is fine for a memory guard)
+        self.max_client_requests = max_client_requests
+        # Public quotes can use a cheaper approximation than invoiced trips; see distance.MAX_ERROR
+        self.distances = DistanceService(model=trip_distance_model)
+        self.quote_distances = DistanceService(model=quote_distance_model)
+        self.dispatch = DispatchEngine()
+        self.aggregates = TripAggregates()
+        # Scheduled trips per driver and per vehicle, for conflict checks, availability and utilisation
+        self.driver_calendar = BookingCalendar()
+        self.vehicle_calendar = BookingCalendar()
+        # Held from a trip's conflict check until it is on both calendars
+        self._booking_lock = threading.Lock()
+        self.fuel_prices = FuelPriceTable(default_price=DEFAULT_FUEL_COST)
+        # Open quotes by vehicle type, then by the fuel price they were made with, so a price
+        # change only visits the quotes it actually moves
+        self._open_quotes = defaultdict(lambda: defaultdict(list))
+        self._quote_lock = threading.RLock()
         # Default for cost estimation
         self.default_vehicle = Vehicle("Van", "DEFAULT001", fuel_litres_per_km=0.1, daily_vehicle_charges=50000)
         self.default_driver = Driver(
@@ -20,42 +71,342 @@ class DriveSyncApp:
             driver_night_allowance=15000
         )
         self.default_driver.vehicle = self.default_vehicle
+        self.storage = storage or MemoryStorage()
+        self.jobs = jobs
+        self._sync_lock = threading.Lock()
+        # Drivers and clients share one id namespace, so creating either is serialised across both
+        self._accounts_lock = threading.RLock()
+        self._client_ids = IdAllocator('C', exists=self.get_account)
+        self.sync(force=True)
+
+    @metrics.timed('sync')
+    def sync(self, force=False):
+        # Pull in rows other worker processes have written since the last call
+        if not (force or self.storage.has_changes()):
+            return
+        with self._sync_lock:
+            rows = self.storage.load_new()
+            for row in rows['vehicles']:
+                self.vehicles.add(Vehicle(row['vehicle_type'], row['vehicle_reg_no'],
+                                          row['fuel_litres_per_km'], row['daily_vehicle_charges']))
+            for row in rows['drivers']:
+                driver = Driver(row['account_id'], row['name'], row['email'], row['contact'],
+                                row['vehicle_type'], row['vehicle_reg_no'],
+                                row['driver_day_allowance'], row['driver_night_allowance'])
+                driver.vehicle = self.get_vehicle(row['vehicle_reg_no'])
+                self.drivers.add(driver)
+            for row in rows['clients']:
+                self.clients.add(Client(row['account_id'], row['name'], row['email'], row['contact']))
+            for row in rows['trips']:
+                driver = self.get_driver(row['driver_id'])
+                vehicle = self.get_vehicle(row['vehicle_reg_no']) or (driver.vehicle if driver else None)
+                trip = Trip((row['start_lat'], row['start_lon']), (row['end_lat'], row['end_lon']),
+                            row['fuel_cost'], vehicle, driver, client_id=row['client_id'],
+                            distance_service=self.distances,
+                            created_at=datetime.fromisoformat(row['created_at']) if row['created_at'] else None,
+                            starts_at=local_time(datetime.fromisoformat(row['starts_at'])) if row['starts_at'] else None,
+                            ends_at=local_time(datetime.fromisoformat(row['ends_at'])) if row['ends_at'] else None)
+                self._record_trip(trip)
+            for row in rows['client_requests']:
+                request = ClientRequest(
+                    row['name'], row['email'], row['contact'], row['goods_description'],
+                    (row['pick_up_lat'], row['pick_up_lon']), (row['drop_off_lat'], row['drop_off_lon']),
+                    row['comments'], estimated_cost=row['estimated_cost'], client_id=row['client_id'],
+                    pick_up_name=row['pick_up_name'], drop_off_name=row['drop_off_name'],
+                    fuel_cost=row['fuel_cost'], record_id=row['id'], request_id=row['request_id'],
+                    status=row['status'] or 'pending'
+                )
+                self.client_requests.add(request)
+                if request.status != 'pending':
+                    with self._quote_lock:
+                        self._closed_requests += 1
+                self._track_quote(request)
+            self.close_client_requests(rows['closed_client_requests'], persist=False)
+            for row in rows['fuel_prices']:
+                self.fuel_prices.set_price(row['price'], row['vehicle_type'],
+                                           datetime.fromisoformat(row['effective_from']))
+            if rows['fuel_prices'] or rows['client_requests']:
+                # The process that changed the price has already written the repriced estimates
+                self.reprice_quotes(persist=False)
 
     def onboard_vehicle(self, vehicle: Vehicle):
-        self.vehicles.append(vehicle)
+        self.vehicles.check(vehicle)
+        self.storage.save_vehicle(vehicle)
+        self.vehicles.add(vehicle)
 
     def add_account(self, account: Account):
-        if isinstance(account, Driver):
-            self.drivers.append(account)
-        elif isinstance(account, Client):
-            self.clients.append(account)
+        # Drivers and clients share one account id namespace
+        with self._accounts_lock:
+            if self.get_account(account.account_id):
+                raise DuplicateRecordError(f"account_id '{account.account_id}' already exists")
+            if isinstance(account, Driver):
+                self.drivers.check(account)
+                self.storage.save_driver(account)
+                self.drivers.add(account)
+            elif isinstance(account, Client):
+                self.clients.check(account)
+                self.storage.save_client(account)
+                self.clients.add(account)
+
+    def update_driver_position(self, driver_id, position=None, available=None):
+        driver = self.get_driver(driver_id)
+        if not driver:
+            raise KeyError(f"Driver '{driver_id}' not found")
+        if position is not None:
+            driver.position = tuple(position)
+        if available is not None:
+            driver.available = available
+        self.dispatch.update(driver)
+        return driver
+
+    def nearest_drivers(self, request: ClientRequest, k=5):
+        return self.dispatch.nearest(request.pick_up_point, k=k, vehicle_type=request.vehicle_type)
+
+    def get_account(self, account_id):
+        return self.drivers.get('account_id', account_id) or self.clients.get('account_id', account_id)
+
+    def get_client(self, client_id):
+        return self.clients.get('account_id', client_id)
+
+    def get_client_by_email(self, email):
+        return self.clients.get('email', email)
+
+    def get_driver(self, driver_id):
+        return self.drivers.get('account_id', driver_id)
 
+    def get_vehicle(self, vehicle_reg_no):
+        return self.vehicles.get('vehicle_reg_no', vehicle_reg_no)
+
+    def trips_for_client(self, client_id):
+        return self.trips.find('client_id', client_id)
+
+    def trips_for_driver(self, driver_id):
+        return self.trips.find('driver_id', driver_id)
+
+    def _quote_vehicle_type(self, request):
+        return request.vehicle_type or self.default_vehicle.vehicle_type
+
+    def open_request_count(self):
+        return len(self.client_requests) - self._closed_requests
+
+    def _check_backlog(self, adding=1):
+        if self.max_client_requests is not None and self.open_request_count() + adding > self.max_client_requests:
+            raise BacklogFull(f"Client request backlog is full ({self.max_client_requests} open requests)")
+
+    def close_client_requests(self, request_ids, persist=True):
+        # Handled requests stay listed, but no longer count against the backlog cap or get repriced
+        closed = []
+        with self._quote_lock:
+            for request_id in request_ids:
+                request = self.client_requests.get('request_id', request_id)
+                if request is not None and request.status == 'pending':
+                    request.status = 'closed'
+                    closed.append(request)
+            self._closed_requests += len(closed)
+        if persist and closed:
+            self.storage.close_client_requests(closed)
+        return closed
+
+    @metrics.timed('add_client_request')
     def add_client_request(self, request: ClientRequest):
-        self.client_requests.append(request)
-        # Estimate cost
+        self._check_backlog()
+        client = self._client_for_request(request)
+        request.fuel_cost = self.fuel_prices.price(self._quote_vehicle_type(request))
+        job = None
+        if self.jobs is not None:
+            request.estimate_status = 'pending'
+            try:
+                job = self.jobs.submit(
+                    estimate_cost, request.pick_up_point, request.drop_off_point, request.fuel_cost,
+                    self.default_vehicle, self.default_driver,
+                    # A worker process would only get a pickled copy of the cache, so it gets an empty service
+                    distance_service=(self.quote_distances if self.jobs.mode == 'thread'
+                                      else DistanceService(cache_size=0, model=self.quote_distances.model)),
+                    name='estimate', on_done=lambda job: self._finish_estimate(request, job)
+                )
+                request.job_id = job.id
+            except QueueFull:
+                # Saturated: the caller pays for its own estimate instead of queueing without bound
+                job = None
+        self.client_requests.add(request)
+        if job is None:
+            self._estimate_inline(request)
+        return client
+
+    def _estimate_inline(self, request):
         try:
-            trip = Trip(
-                start_location=request.pick_up_point,
-                end_location=request.drop_off_point,
-                fuel_cost=5000,  # Default fuel cost
-                vehicle=self.default_vehicle,
-                driver=self.default_driver
-            )
-            request.estimated_cost = trip.total_cost
+            request.quote_trip = self._quote_trip(request)
+            with metrics.OPERATION_SECONDS.time(operation='estimate_cost'):
+                cost = request.quote_trip.total_cost
+            self._set_quote(request, cost)
         except Exception as e:
             request.estimated_cost = 0.0
-            print(f"Cost estimation failed: {e}")
+            request.estimate_status = 'failed'
+            metrics.ESTIMATION_FAILURES.inc()
+            logger.warning("Cost estimation failed: %s", e)
+        self.storage.save_client_request(request)
+
+    def _finish_estimate(self, request, job):
+        if job.error:
+            request.estimated_cost = 0.0
+            request.estimate_status = 'failed'
+            metrics.ESTIMATION_FAILURES.inc()
+            logger.warning("Cost estimation failed: %s", job.error)
+        else:
+            self._set_quote(request, job.result)
+        self.storage.save_client_request(request)
+
+    def _quote_trip(self, request):
+        # Costed lazily: the distance is only measured when the estimate is first read
+        return Trip(request.pick_up_point, request.drop_off_point, request.fuel_cost,
+                    self.default_vehicle, self.default_driver, distance_service=self.quote_distances)
+
+    def _set_quote(self, request, cost):
+        request.estimated_cost = cost
+        with self._quote_lock:
+            # The price may have moved while the estimate was queued
+            price = self.fuel_prices.price(self._quote_vehicle_type(request))
+            if price != request.fuel_cost:
+                self._reprice(request, price)
+            # Done only once repriced, so a poll never reads the stale figure
+            request.estimate_status = 'done'
+            self._track_quote(request)
+
+    def _track_quote(self, request):
+        if request.status == 'pending' and request.estimate_status == 'done':
+            with self._quote_lock:
+                self._open_quotes[self._quote_vehicle_type(request)][request.fuel_cost].append(request)
+
+    def _reprice(self, request, price):
+        # Estimates made in a worker, in bulk or by another process have no Trip here yet; the
+        # distance is measured once, on the first repricing, and stays cached on the Trip after that
+        request.fuel_cost = price
+        if request.quote_trip is None:
+            request.quote_trip = self._quote_trip(request)
+        else:
+            request.quote_trip.fuel_cost = price
+        request.estimated_cost = request.quote_trip.total_cost
+
+    @metrics.timed('reprice_quotes')
+    def reprice_quotes(self, vehicle_types=None, at=None, persist=True):
+        # Re-cost open quotes made at a fuel price that is no longer current; quotes already at
+        # the current price, and those for other vehicle types, are not visited
+        changed = []
+        with self._quote_lock:
+            for vehicle_type in list(vehicle_types or self._open_quotes):
+                buckets = self._open_quotes.get(vehicle_type)
+                if not buckets:
+                    continue
+                price = self.fuel_prices.price(vehicle_type, at)
+                for quoted in [p for p in buckets if p != price]:
+                    for request in buckets.pop(quoted):
+                        if request.status != 'pending':
+                            continue
+                        self._reprice(request, price)
+                        buckets[price].append(request)
+                        changed.append(request)
+        if persist and changed:
+            self.storage.update_client_request_estimates(changed)
+        return changed
+
+    def set_fuel_price(self, price, vehicle_type=None, effective_from=None):
+        effective_from = self.fuel_prices.set_price(price, vehicle_type, effective_from)
+        self.storage.save_fuel_price(price, vehicle_type or None, effective_from)
+        return self.reprice_quotes([vehicle_type] if vehicle_type else None)
+
+    @metrics.timed('add_client_requests')
+    def add_client_requests(self, requests):
+        # Bulk variant of add_client_request: one vectorised estimate and one storage batch for the lot
+        if not requests:
+            return []
+        self._check_backlog(len(requests))
+        for request in requests:
+            request.fuel_cost = self.fuel_prices.price(self._quote_vehicle_type(request))
+        _, costs = self.quote_batch([r.pick_up_point for r in requests], [r.drop_off_point for r in requests],
+                                    [r.fuel_cost for r in requests])
+        # Accounts are written one at a time, outside the buffer: an email another worker has just
+        # taken fails here, where _client_for_request can reload it and retry, not at the flush
+        for request in requests:
+            self._client_for_request(request)
+        with self.storage.batch():
+            for request, cost in zip(requests, costs):
+                request.estimated_cost = float(cost)
+                request.estimate_status = 'done'
+                self.storage.save_client_request(request)
+        # Only once the rows are committed, so a failed flush leaves nothing behind in memory
+        for request in requests:
+            self.client_requests.add(request)
+            self._track_quote(request)
+        return requests
+
+    @metrics.timed('quote')
+    def quote(self, start, end, vehicle_type=None, fuel_cost=None):
+        # Read-only counterpart of add_client_request's estimate: same vehicle, driver, distance model
+        # and fuel price, but nothing is stored
+        fuel_cost = fuel_cost or self.fuel_prices.price(vehicle_type or self.default_vehicle.vehicle_type)
+        return Trip(start, end, fuel_cost, self.default_vehicle, self.default_driver,
+                    distance_service=self.quote_distances)
+
+    def _client_for_request(self, request):
         # Create a client if not exists
-        client = next((c for c in self.clients if c.email == request.email), None)
+        client = self.get_client_by_email(request.email)
         if not client:
-            account_id = f"C{len(self.clients) + 1:03d}"
-            client = Client(account_id, request.name, request.email, request.contact)
-            self.add_account(client)
+            with self._accounts_lock:
+                for attempt in range(3):
+                    # Re-checked under the lock: a concurrent request may have just created it
+                    client = self.get_client_by_email(request.email)
+                    if client:
+                        break
+                    client = Client(self._client_ids.allocate(), request.name, request.email, request.contact)
+                    try:
+                        self.add_account(client)
+                        break
+                    except DuplicateRecordError:
+                        if attempt == 2:
+                            raise
+                        # Another worker process took the id or the email first; load its rows and retry
+                        self.sync(force=True)
+        request.client_id = client.account_id
         return client
 
-    def process_trip(self, client_id, driver_id, start, end, fuel_cost):
-        client = next((c for c in self.clients if c.account_id == client_id), None)
-        driver = next((d for d in self.drivers if d.account_id == driver_id), None)
+    @metrics.timed('quote_batch')
+    def quote_batch(self, starts, ends, fuel_costs=None, vehicles=None, drivers=None):
+        # vehicles/drivers are optional per-lane lists; None entries use the estimation defaults.
+        # fuel_costs defaults to the current price for each lane's vehicle type.
+        count = len(starts)
+        vehicles = [v or self.default_vehicle for v in (vehicles or [None] * count)]
+        drivers = [d or self.default_driver for d in (drivers or [None] * count)]
+        if fuel_costs is None:
+            fuel_costs = [self.fuel_prices.price(v.vehicle_type) for v in vehicles]
+        # numpy is only needed here and in the planner, so it is imported on first use rather than at startup
+        import batch
+        # Measured like single quotes, so an imported lane costs what the form would have quoted
+        return batch.estimate_batch(
+            starts, ends, fuel_costs,
+            fuel_litres_per_km=[v.fuel_litres_per_km for v in vehicles],
+            daily_vehicle_charges=[v.daily_vehicle_charges for v in vehicles],
+            driver_day_allowance=[d.driver_day_allowance for d in drivers],
+            driver_night_allowance=[d.driver_night_allowance for d in drivers],
+            model=self.quote_distances.model,
+            geodesic=self.quote_distances.distance
+        )
+
+    def pending_requests(self):
+        return [r for r in self.client_requests if r.status == 'pending']
+
+    @metrics.timed('plan_consolidation')
+    def plan_consolidation(self, fuel_cost=None, max_stops=6, max_route_km=600):
+        from planner import ConsolidationPlanner
+        fuel_cost = fuel_cost or self.fuel_prices.price(self.default_vehicle.vehicle_type)
+        planner = ConsolidationPlanner(fuel_cost, self.default_vehicle, self.default_driver,
+                                       max_stops=max_stops, max_route_km=max_route_km)
+        return planner.plan(self.pending_requests(), self.drivers)
+
+    @metrics.timed('process_trip')
+    def process_trip(self, client_id, driver_id, start, end, fuel_cost, starts_at=None, ends_at=None):
+        # Without starts_at the trip is unscheduled and does not hold the driver or vehicle
+        client = self.get_client(client_id)
+        driver = self.get_driver(driver_id)
 
         if not (client and driver):
             return "⚠️ Client or Driver not found"
@@ -63,12 +414,94 @@ class DriveSyncApp:
         if not driver.vehicle:
             return "⚠️ Driver has no vehicle assigned"
 
-        trip = Trip(start, end, fuel_cost, driver.vehicle, driver, client_id=client_id)
-        self.trips.append(trip)
+        if ends_at is not None and starts_at is None:
+            return "⚠️ A trip with an end time needs a start time"
+
+        trip = Trip(start, end, fuel_cost, driver.vehicle, driver, client_id=client_id, distance_service=self.distances,
+                    starts_at=local_time(starts_at), ends_at=local_time(ends_at))
+        if trip.starts_at is not None and trip.ends_at <= trip.starts_at:
+            return "⚠️ Trip must end after it starts"
+        # Unscheduled trips can't conflict, so only scheduled ones wait for the booking lock. The
+        # lock and calendars cover this process; SQLiteStorage checks again in the database, where
+        # another worker's booking may not have been synced yet.
+        with self._booking_lock if trip.starts_at is not None else nullcontext():
+            conflict = self._booking_conflict(trip)
+            if conflict:
+                return conflict
+            try:
+                self.storage.save_trip(trip)
+            except BookingConflict as e:
+                # Load the other worker's booking so the calendars know about it from now on
+                self.sync(force=True)
+                return self._booking_conflict(trip) or f"⚠️ {e}"
+            self._record_trip(trip)
 
         driver.assign_trip(trip)
         result = client.request_trip(trip)
         return f"{result} (Total Cost: UGX {trip.total_cost:,.2f})"
 
+    def _booking_conflict(self, trip):
+        if trip.starts_at is None:
+            return None
+        start, end = trip.starts_at.timestamp(), trip.ends_at.timestamp()
+        for calendar, key, label in ((self.driver_calendar, trip.driver_id, f"Driver {trip.driver.name}"),
+                                     (self.vehicle_calendar, trip.vehicle.vehicle_reg_no, f"Vehicle {trip.vehicle.vehicle_reg_no}")):
+            booked = calendar.bookings(key, start, end)
+            if booked:
+                other = booked[0][2]
+                return f"⚠️ {label} is already booked from {other.starts_at:%Y-%m-%d %H:%M} to {other.ends_at:%Y-%m-%d %H:%M}"
+        return None
+
+    def _record_trip(self, trip):
+        view = self.trips.append(trip)
+        self.aggregates.record(trip)
+        if trip.starts_at is not None:
+            start, end = trip.starts_at.timestamp(), trip.ends_at.timestamp()
+            if trip.driver_id is not None:
+                self.driver_calendar.add(trip.driver_id, start, end, view)
+            if trip.vehicle is not None:
+                self.vehicle_calendar.add(trip.vehicle.vehicle_reg_no, start, end, view)
+
+    def free_drivers(self, starts_at, ends_at):
+        # Drivers with a vehicle, where neither the driver nor the vehicle is booked in the window
+        start, end = starts_at.timestamp(), ends_at.timestamp()
+        busy_drivers = self.driver_calendar.busy(start, end)
+        busy_vehicles = self.vehicle_calendar.busy(start, end)
+        return [driver for driver in self.drivers.snapshot()
+                if driver.vehicle and driver.account_id not in busy_drivers
+                and driver.vehicle.vehicle_reg_no not in busy_vehicles]
+
+    def free_vehicles(self, starts_at, ends_at):
+        busy = self.vehicle_calendar.busy(starts_at.timestamp(), ends_at.timestamp())
+        return [vehicle for vehicle in self.vehicles.snapshot() if vehicle.vehicle_reg_no not in busy]
+
+    def vehicle_utilization(self, starts_at, ends_at):
+        # Share of the window each vehicle is booked for, from the same calendar the conflict checks use
+        start, end = starts_at.timestamp(), ends_at.timestamp()
+        booked_times = self.vehicle_calendar.booked_times(start, end)
+        report = []
+        for vehicle in self.vehicles.snapshot():
+            booked, trips = booked_times.get(vehicle.vehicle_reg_no, (0, 0))
+            report.append({
+                'vehicle_reg_no': vehicle.vehicle_reg_no,
+                'vehicle_type': vehicle.vehicle_type,
+                'trips': trips,
+                'booked_hours': round(booked / 3600, 2),
+                'utilization': round(booked / (end - start), 4),
+            })
+        return report
+
+    def summary(self, kind, key):
+        return self.aggregates.summary(kind, key)
+
+    @metrics.timed('process_trips')
+    def process_trips(self, trips):
+        # trips is a list of dicts with the process_trip keyword arguments
+        with self.storage.batch():
+            return [self.process_trip(**trip) for trip in trips]
+
+    def submit_trips(self, trips):
+        return self.jobs.submit(self.process_trips, trips, name='process_trips', in_process=True)
+
     def list_all_accounts(self):
-        return [f"{acc.account_type()}: {acc.get_details()}" for acc in self.drivers + self.clients]
\ No newline at end of file
+        return [f"{acc.account_type()}: {acc.get_details()}" for acc in chain(self.drivers, self.clients)]
\ No newline at end of file
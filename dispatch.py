@@ -0,0 +1,139 @@
+import heapq
+import math
+import threading
+from collections import defaultdict
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 110.574
+
+# Which driver vehicle types may take a load booked for a given vehicle type
+COMPATIBLE_VEHICLE_TYPES = {
+    'Car': ('Car', 'Van', 'Truck'),
+    'Van': ('Van', 'Truck'),
+    'Truck': ('Truck',),
+    'Bus': ('Bus',),
+}
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    h = (math.sin((phi2 - phi1) / 2) ** 2 +
+         math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(h, 1.0)))
+
+
+class SpatialGrid:
+    # Fixed-size lat/lon buckets (a flat geohash); k-nearest searches ring by ring outwards
+    def __init__(self, cell_size=0.1):
+        self.cell_size = cell_size
+        self._cells = defaultdict(dict)
+        self._positions = {}
+        # Bounding box of every cell ever used; only grows, which keeps it cheap and still safe
+        self._bounds = None
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_size), math.floor(lon / self.cell_size))
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, key):
+        return key in self._positions
+
+    def insert(self, key, value, lat, lon):
+        self.remove(key)
+        cell = self._cell(lat, lon)
+        self._cells[cell][key] = (lat, lon, value)
+        self._positions[key] = cell
+        if self._bounds is None:
+            self._bounds = [cell[0], cell[0], cell[1], cell[1]]
+        else:
+            bounds = self._bounds
+            bounds[0], bounds[1] = min(bounds[0], cell[0]), max(bounds[1], cell[0])
+            bounds[2], bounds[3] = min(bounds[2], cell[1]), max(bounds[3], cell[1])
+
+    def remove(self, key):
+        cell = self._positions.pop(key, None)
+        if cell is not None:
+            bucket = self._cells[cell]
+            bucket.pop(key, None)
+            if not bucket:
+                del self._cells[cell]
+
+    def nearest(self, lat, lon, k):
+        # Returns up to k (distance_km, key, value) tuples, closest first
+        if not self._positions or k <= 0:
+            return []
+        row, col = self._cell(lat, lon)
+        min_row, max_row, min_col, max_col = self._bounds
+        max_ring = max(abs(row - min_row), abs(row - max_row), abs(col - min_col), abs(col - max_col))
+        best = []
+        for ring in range(max_ring + 1):
+            for cell in self._ring(row, col, ring):
+                bucket = self._cells.get(cell)
+                if not bucket:
+                    continue
+                for key, (other_lat, other_lon, value) in bucket.items():
+                    distance = haversine_km(lat, lon, other_lat, other_lon)
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, key, value))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, key, value))
+            # Anything not yet visited lies at least `ring` whole cells away
+            if len(best) == k and -best[0][0] <= self._ring_floor_km(lat, ring):
+                break
+        return sorted((-neg, key, value) for neg, key, value in best)
+
+    def _ring(self, row, col, ring):
+        if ring == 0:
+            yield (row, col)
+            return
+        for c in range(col - ring, col + ring + 1):
+            yield (row - ring, c)
+            yield (row + ring, c)
+        for r in range(row - ring + 1, row + ring):
+            yield (r, col - ring)
+            yield (r, col + ring)
+
+    def _ring_floor_km(self, lat, ring):
+        # Conservative: use the narrowest longitude spacing reachable within the searched band
+        span = ring * self.cell_size
+        widest_lat = min(abs(lat) + span + self.cell_size, 90.0)
+        return span * KM_PER_DEGREE_LAT * math.cos(math.radians(widest_lat))
+
+
+class DispatchEngine:
+    # Only available drivers with a known position are indexed, one grid per vehicle type,
+    # so a query never has to skip over busy drivers or the wrong kind of vehicle
+    def __init__(self, cell_size=0.1):
+        self.cell_size = cell_size
+        self._grids = defaultdict(lambda: SpatialGrid(cell_size))
+        # Grid buckets are mutated in place, so searches and position updates take turns
+        self._lock = threading.RLock()
+
+    def update(self, driver):
+        with self._lock:
+            self.remove(driver)
+            if driver.available and driver.position is not None:
+                lat, lon = driver.position
+                self._grids[driver.vehicle_type].insert(driver.account_id, driver, lat, lon)
+
+    def remove(self, driver):
+        with self._lock:
+            for grid in self._grids.values():
+                grid.remove(driver.account_id)
+
+    def available_count(self):
+        return sum(len(grid) for grid in self._grids.values())
+
+    def nearest(self, point, k=5, vehicle_type=None):
+        lat, lon = point
+        types = COMPATIBLE_VEHICLE_TYPES.get(vehicle_type, (vehicle_type,)) if vehicle_type else list(self._grids)
+        candidates = []
+        with self._lock:
+            for kind in types:
+                grid = self._grids.get(kind)
+                if grid:
+                    candidates.extend(grid.nearest(lat, lon, k))
+        return [(driver, distance) for distance, _, driver in heapq.nsmallest(k, candidates, key=lambda c: c[0])]
@@ -0,0 +1,133 @@
+import math
+import threading
+from collections import OrderedDict
+import metrics
+
+# WGS-84
+EQUATORIAL_RADIUS_KM = 6378.137
+FLATTENING = 1 / 298.257223563
+ECCENTRICITY_SQUARED = FLATTENING * (2 - FLATTENING)
+MEAN_RADIUS_KM = 6371.0088
+
+
+def geodesic_km(start, end):
+    from geopy.distance import geodesic
+    metrics.GEODESIC_CALLS.inc()
+    return geodesic(start, end).km
+
+
+def haversine_km(start, end):
+    # Great circle on a sphere of the mean earth radius
+    phi1 = math.radians(start[0])
+    phi2 = math.radians(end[0])
+    h = (math.sin((phi2 - phi1) / 2) ** 2 +
+         math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(end[1] - start[1]) / 2) ** 2)
+    return 2 * MEAN_RADIUS_KM * math.asin(math.sqrt(min(h, 1.0)))
+
+
+def equirectangular_km(start, end):
+    # Flat-earth projection about the mean latitude, scaled by the ellipsoid's meridian and
+    # prime-vertical radii there; only good while the points are a few degrees apart
+    phi = math.radians((start[0] + end[0]) / 2)
+    w = 1 - ECCENTRICITY_SQUARED * math.sin(phi) ** 2
+    meridian = EQUATORIAL_RADIUS_KM * (1 - ECCENTRICITY_SQUARED) / w ** 1.5
+    prime_vertical = EQUATORIAL_RADIUS_KM / math.sqrt(w)
+    # The short way round: 179.5 and -179.5 are one degree apart, not 359
+    dlon = (end[1] - start[1] + 180) % 360 - 180
+    return math.hypot(math.radians(end[0] - start[0]) * meridian,
+                      math.radians(dlon) * prime_vertical * math.cos(phi))
+
+
+DISTANCE_MODELS = {
+    'geodesic': geodesic_km,
+    'haversine': haversine_km,
+    'equirectangular': equirectangular_km,
+}
+
+# Worst error against geodesic() for any two points in UGANDA_BOUNDS, as (km, fraction of the
+# geodesic distance); benchmarks/distance_models.py measures these and fails if they are exceeded
+UGANDA_BOUNDS = ((-1.5, 29.5), (4.2, 35.0))
+MAX_ERROR = {
+    'geodesic': (0.0, 0.0),
+    'haversine': (3.6, 0.006),
+    'equirectangular': (0.2, 0.0002),
+}
+
+
+def in_bounds(point, bounds=UGANDA_BOUNDS):
+    (south, west), (north, east) = bounds
+    return south <= point[0] <= north and west <= point[1] <= east
+
+
+class DistanceService:
+    def __init__(self, cache_size=4096, model='geodesic'):
+        if model not in DISTANCE_MODELS:
+            raise ValueError(f"Unknown distance model '{model}'; expected one of {', '.join(DISTANCE_MODELS)}")
+        self.cache_size = cache_size
+        self.model = model
+        self._model = DISTANCE_MODELS[model]
+        self._matrix = {}
+        self._cache = OrderedDict()
+        # Guards the LRU bookkeeping only; distances are measured outside it
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _measure(self, start, end):
+        # The approximations are only held to MAX_ERROR inside UGANDA_BOUNDS; any pair with a point
+        # outside it is measured with geodesic() instead
+        if self._model is geodesic_km or (in_bounds(start) and in_bounds(end)):
+            return self._model(start, end)
+        return geodesic_km(start, end)
+
+    def precompute(self, locations):
+        # locations is a list of (name, (lat, lon)) pairs, the same shape as LOCATIONS in locations.py
+        points = [tuple(coords) for _, coords in locations]
+        for start in points:
+            for end in points:
+                if (start, end) not in self._matrix:
+                    self._matrix[(start, end)] = 0.0 if start == end else self._measure(start, end)
+
+    def distance(self, start, end):
+        key = (tuple(start), tuple(end))
+        known = self._matrix.get(key)
+        if known is not None:
+            metrics.DISTANCE_LOOKUPS.inc(source='matrix')
+            return known
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self.hits += 1
+                self._cache.move_to_end(key)
+            else:
+                self.misses += 1
+        if cached is not None:
+            metrics.DISTANCE_LOOKUPS.inc(source='cache')
+            return cached
+        metrics.DISTANCE_LOOKUPS.inc(source=self.model)
+        value = self._measure(start, end)
+        with self._lock:
+            self._cache[key] = value
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return value
+
+    def __getstate__(self):
+        # Shipped to process-pool workers; each copy gets a lock of its own
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def stats(self):
+        return {
+            "model": self.model,
+            "matrix_size": len(self._matrix),
+            "cache_size": len(self._cache),
+            "cache_capacity": self.cache_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,149 @@
+from flask import url_for
+from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileRequired
+from wtforms import StringField, FloatField, SubmitField, SelectField, TextAreaField, PasswordField, DateTimeLocalField
+from wtforms.validators import DataRequired, Email, NumberRange, Optional
+from wtforms import ValidationError
+from wtforms.widgets import TextInput
+from markupsafe import Markup, escape
+import metrics
+from locations import LOCATIONS, gazetteer
+
+VEHICLE_TYPES = ['Van', 'Truck', 'Car', 'Bus']
+
+class InstrumentedForm(FlaskForm):
+    def validate(self, extra_validators=None):
+        with metrics.FORM_SECONDS.time(form=type(self).__name__):
+            return super(InstrumentedForm, self).validate(extra_validators=extra_validators)
+
+class LocationInput(TextInput):
+    # A text box offering the hubs up front; base.html replaces the suggestions with /api/locations
+    # results as the user types, so the page never carries the whole gazetteer
+    def __call__(self, field, **kwargs):
+        kwargs.setdefault('list', f"{field.id}-suggestions")
+        kwargs.setdefault('autocomplete', 'off')
+        kwargs.setdefault('data-suggest', url_for('location_suggestions'))
+        options = ''.join(f'<option value="{escape(name)}">' for name, _ in LOCATIONS)
+        return Markup(f'{super(LocationInput, self).__call__(field, **kwargs)}'
+                      f'<datalist id="{field.id}-suggestions">{options}</datalist>')
+
+class LocationField(StringField):
+    # Any place in the gazetteer; a typed name is checked against its index, not a list of options
+    widget = LocationInput()
+
+    def __init__(self, label=None, validators=None, placeholder='', **kwargs):
+        kwargs.setdefault('render_kw', {'placeholder': placeholder})
+        super(LocationField, self).__init__(label, validators, **kwargs)
+
+    def pre_validate(self, form):
+        if not self.data:
+            return
+        place = gazetteer().get(self.data)
+        if place is None:
+            raise ValidationError('Unknown location; pick one of the suggestions.')
+        # "fort-portal" is stored and shown as "Fort Portal"
+        self.data = place.name
+
+class ClientForm(InstrumentedForm):
+    account_id = StringField('Account ID', validators=[DataRequired()])
+    name = StringField('Name', validators=[DataRequired()])
+    email = StringField('Email', validators=[DataRequired(), Email()])
+    contact = StringField('Contact', validators=[DataRequired()])
+    submit = SubmitField('Create Client')
+
+class DriverForm(InstrumentedForm):
+    account_id = StringField('Account ID', validators=[DataRequired()])
+    name = StringField('Name', validators=[DataRequired()])
+    email = StringField('Email', validators=[DataRequired(), Email()])
+    contact = StringField('Contact', validators=[DataRequired()])
+    vehicle_type = SelectField('Vehicle Type', choices=[
+        ('', 'Select Vehicle Type'), ('Van', 'Van'), ('Truck', 'Truck'), ('Car', 'Car'), ('Bus', 'Bus')
+    ], validators=[DataRequired()])
+    vehicle_reg_no = SelectField('Vehicle Registration Number', validators=[DataRequired()])
+    driver_day_allowance = FloatField('Day Allowance (UGX)', validators=[DataRequired(), NumberRange(min=0)])
+    driver_night_allowance = FloatField('Night Allowance (UGX)', validators=[DataRequired(), NumberRange(min=0)])
+    submit = SubmitField('Add Driver')
+
+    def __init__(self, vehicles, *args, **kwargs):
+        super(DriverForm, self).__init__(*args, **kwargs)
+        self.vehicle_reg_no.choices = [('', 'Select Vehicle')] + [(v.vehicle_reg_no, v.vehicle_reg_no) for v in vehicles]
+
+class VehicleForm(InstrumentedForm):
+    vehicle_type = SelectField('Vehicle Type', choices=[
+        ('', 'Select Vehicle Type'), ('Van', 'Van'), ('Truck', 'Truck'), ('Car', 'Car'), ('Bus', 'Bus')
+    ], validators=[DataRequired()])
+    vehicle_reg_no = StringField('Vehicle Registration Number', validators=[DataRequired()])
+    fuel_litres_per_km = FloatField('Fuel Litres per KM', validators=[DataRequired(), NumberRange(min=0)])
+    daily_vehicle_charges = FloatField('Daily Vehicle Charges (UGX)', validators=[DataRequired(), NumberRange(min=0)])
+    submit = SubmitField('Add Vehicle')
+
+class TripForm(InstrumentedForm):
+    client_id = SelectField('Client ID', validators=[DataRequired()])
+    driver_id = SelectField('Driver ID', validators=[DataRequired()])
+    start_location = LocationField('Start Location', placeholder='Start typing a place name')
+    start_location_lat = FloatField('Start Latitude (Override)')
+    start_location_lon = FloatField('Start Longitude (Override)')
+    end_location = LocationField('End Location', placeholder='Start typing a place name')
+    end_location_lat = FloatField('End Latitude (Override)')
+    end_location_lon = FloatField('End Longitude (Override)')
+    fuel_cost = FloatField('Fuel Cost per Litre (UGX)', validators=[DataRequired(), NumberRange(min=0)])
+    starts_at = DateTimeLocalField('Start Time', format='%Y-%m-%dT%H:%M', validators=[Optional()])
+    ends_at = DateTimeLocalField('End Time', format='%Y-%m-%dT%H:%M', validators=[Optional()])
+    submit = SubmitField('Process Trip')
+
+    def __init__(self, clients, drivers, *args, **kwargs):
+        super(TripForm, self).__init__(*args, **kwargs)
+        self.client_id.choices = [('', 'Select Client')] + [(c.account_id, f"{c.account_id} - {c.name}") for c in clients]
+        self.driver_id.choices = [('', 'Select Driver')] + [(d.account_id, f"{d.account_id} - {d.name}") for d in drivers]
+
+    def validate(self, extra_validators=None):
+        if not super(TripForm, self).validate(extra_validators=extra_validators):
+            return False
+        # Validate start location
+        if not self.start_location.data and not (self.start_location_lat.data and self.start_location_lon.data):
+            self.start_location.errors.append("Please select a start location or provide valid coordinates.")
+            return False
+        # Validate end location
+        if not self.end_location.data and not (self.end_location_lat.data and self.end_location_lon.data):
+            self.end_location.errors.append("Please select an end location or provide valid coordinates.")
+            return False
+        # Validate schedule
+        if self.ends_at.data and not self.starts_at.data:
+            self.starts_at.errors.append("Please give a start time for a trip with an end time.")
+            return False
+        if self.ends_at.data and self.ends_at.data <= self.starts_at.data:
+            self.ends_at.errors.append("End time must be after the start time.")
+            return False
+        return True
+
+class ClientRequestForm(InstrumentedForm):
+    name = StringField('Name', validators=[DataRequired()])
+    email = StringField('Email', validators=[DataRequired(), Email()])
+    contact = StringField('Contact', validators=[DataRequired()])
+    goods_description = TextAreaField('Description of Goods', validators=[DataRequired()])
+    pick_up_point = LocationField('Pick-up Point', validators=[DataRequired()], placeholder='Start typing a place name')
+    drop_off_point = LocationField('Drop-off Point', validators=[DataRequired()], placeholder='Start typing a place name')
+    comments = TextAreaField('Comments')
+    submit = SubmitField('Submit Request')
+
+class ImportRequestsForm(InstrumentedForm):
+    file = FileField('Requests File (JSONL or CSV)', validators=[FileRequired()])
+    file_format = SelectField('Format', choices=[('', 'Detect from file name'), ('jsonl', 'JSONL'), ('csv', 'CSV')], default='')
+    submit = SubmitField('Import Requests')
+
+class FuelPriceForm(InstrumentedForm):
+    fuel_cost = FloatField('Fuel Cost per Litre (UGX)', validators=[DataRequired(), NumberRange(min=0.01)])
+    vehicle_type = SelectField('Vehicle Type', choices=[('', 'All Vehicle Types')] + [(t, t) for t in VEHICLE_TYPES], default='')
+    effective_from = DateTimeLocalField('Effective From', format='%Y-%m-%dT%H:%M', validators=[Optional()])
+    submit = SubmitField('Set Fuel Cost')
+
+class RepriceQuotesForm(InstrumentedForm):
+    submit = SubmitField('Reprice Open Quotes')
+
+class CloseRequestForm(InstrumentedForm):
+    submit = SubmitField('Close')
+
+class LoginForm(InstrumentedForm):
+    username = StringField('Username', validators=[DataRequired()])
+    password = PasswordField('Password', validators=[DataRequired()])
+    submit = SubmitField('Login')
@@ -0,0 +1,39 @@
+from bisect import bisect_right, insort
+from collections import defaultdict
+from datetime import datetime
+from itertools import count
+
+
+class FuelPriceTable:
+    # Prices per litre with effective dates, per vehicle type; a vehicle_type of None applies to
+    # every type that has no price of its own at that date
+    def __init__(self, default_price=5000):
+        self.default_price = default_price
+        self._entries = defaultdict(list)
+        self._sequence = count()
+
+    def set_price(self, price, vehicle_type=None, effective_from=None):
+        if price is None or price <= 0:
+            raise ValueError("Fuel price must be greater than zero")
+        effective_from = effective_from or datetime.now()
+        # The sequence number breaks ties, so the latest entry for the same date wins
+        insort(self._entries[vehicle_type or None], (effective_from, next(self._sequence), price))
+        return effective_from
+
+    def price(self, vehicle_type=None, at=None):
+        at = at or datetime.now()
+        for key in ((vehicle_type, None) if vehicle_type else (None,)):
+            entries = self._entries.get(key)
+            if entries:
+                position = bisect_right(entries, (at, float('inf')))
+                if position:
+                    return entries[position - 1][2]
+        return self.default_price
+
+    def entries(self):
+        return sorted(
+            ({'vehicle_type': key, 'effective_from': effective_from, 'price': price}
+             for key, entries in self._entries.items() for effective_from, _, price in entries),
+            key=lambda entry: (entry['effective_from'], entry['vehicle_type'] or ''),
+            reverse=True
+        )
@@ -0,0 +1,114 @@
+import csv
+import json
+import time
+
+from core import BacklogFull
+
+FORMATS = ('jsonl', 'csv')
+
+
+class ImportReport:
+    def __init__(self, max_errors=1000):
+        self.processed = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self.max_errors = max_errors
+        # Why the import ended before the end of the file, if it did
+        self.stopped = None
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add_error(self, record_number, messages):
+        self.failed += 1
+        # Keep counting past the cap but stop storing, so a bad file can't exhaust memory
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'record': record_number, 'errors': messages})
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    @property
+    def records_per_second(self):
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self):
+        return {
+            'processed': self.processed,
+            'imported': self.imported,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+            'stopped': self.stopped,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'records_per_second': round(self.records_per_second, 1),
+        }
+
+
+def detect_format(filename, default='jsonl'):
+    return 'csv' if filename and filename.lower().endswith('.csv') else default
+
+
+def read_records(lines, fmt):
+    # Yields (record_number, record, error) one line at a time; never holds the whole file
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for number, row in enumerate(reader, start=1):
+            yield number, row, None
+        return
+    if fmt != 'jsonl':
+        raise ValueError(f"Unsupported format '{fmt}', expected one of {', '.join(FORMATS)}")
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, None, [f"Invalid JSON: {e}"]
+            continue
+        if not isinstance(record, dict):
+            yield number, None, ["Record must be a JSON object"]
+            continue
+        yield number, record, None
+
+
+def import_requests(lines, fmt, logic, validate, batch_size=500, max_errors=1000):
+    # validate(record) returns (ClientRequest, None) or (None, [messages])
+    report = ImportReport(max_errors=max_errors)
+    records = read_records(lines, fmt)
+    pending, numbers = [], []
+    for number, record, errors in records:
+        report.processed += 1
+        if record is not None:
+            client_request, errors = validate(record)
+        if errors:
+            report.add_error(number, errors)
+            continue
+        pending.append(client_request)
+        numbers.append(number)
+        if len(pending) >= batch_size:
+            if not _add_batch(logic, pending, numbers, report):
+                break
+            pending, numbers = [], []
+    else:
+        if pending:
+            _add_batch(logic, pending, numbers, report)
+    if report.stopped:
+        # The backlog is full: the rest of the file is counted as rejected, not validated or queued
+        for number, _, _ in records:
+            report.processed += 1
+            report.add_error(number, [report.stopped])
+    return report.finish()
+
+
+def _add_batch(logic, requests, numbers, report):
+    try:
+        report.imported += len(logic.add_client_requests(requests))
+    except BacklogFull as e:
+        report.stopped = str(e)
+        for number in numbers:
+            report.add_error(number, [report.stopped])
+        return False
+    return True
@@ -0,0 +1,123 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+MODES = ('thread', 'process')
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, name):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.created_at = time.time()
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self._future = None
+
+    @property
+    def status(self):
+        if self.finished_at is not None:
+            return 'failed' if self.error else 'done'
+        if self._future is not None and self._future.running():
+            return 'running'
+        return 'queued'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class JobQueue:
+    # mode picks the pool for CPU-bound work. Jobs that mutate DriveSyncApp state must be
+    # submitted with in_process=True and always run on threads, since a worker process
+    # would only see a pickled copy of the registry.
+    def __init__(self, workers=4, mode='thread', max_pending=1000, max_jobs=10000):
+        if mode not in MODES:
+            raise ValueError(f"Unknown worker mode '{mode}', expected one of {', '.join(MODES)}")
+        self.mode = mode
+        self.max_pending = max_pending
+        self.max_jobs = max_jobs
+        self._threads = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='drivesync-job')
+        self._processes = ProcessPoolExecutor(max_workers=workers) if mode == 'process' else None
+        self._pending = 0
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, name=None, on_done=None, in_process=False, **kwargs):
+        # Reject instead of queueing without bound; callers decide whether to run inline or return 503
+        job = Job(name or getattr(fn, '__name__', 'job'))
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFull(f"Job queue is full ({self.max_pending} pending jobs)")
+            self._pending += 1
+            self._jobs[job.id] = job
+            self._trim()
+        executor = self._processes if self._processes and not in_process else self._threads
+        try:
+            job._future = executor.submit(fn, *args, **kwargs)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+                self._jobs.pop(job.id, None)
+            raise
+        job._future.add_done_callback(lambda future: self._finish(job, future, on_done))
+        return job
+
+    def _finish(self, job, future, on_done):
+        try:
+            job.result = future.result()
+        except Exception as e:
+            job.error = str(e) or type(e).__name__
+            logger.warning("Job %s (%s) failed: %s", job.id, job.name, job.error)
+        try:
+            if on_done:
+                on_done(job)
+        except Exception:
+            logger.exception("Completion callback for job %s (%s) failed", job.id, job.name)
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._pending -= 1
+
+    def _trim(self):
+        # Forget the oldest finished jobs once the table is full (plus some headroom so this
+        # scan doesn't run on every submit); unfinished ones are kept
+        excess = len(self._jobs) - self.max_jobs
+        if excess <= 0:
+            return
+        excess += self.max_jobs // 10
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished_at is not None][:excess]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def stats(self):
+        return {'mode': self.mode, 'pending': self.pending, 'max_pending': self.max_pending, 'tracked_jobs': len(self._jobs)}
+
+    def shutdown(self, wait=True):
+        self._threads.shutdown(wait=wait)
+        if self._processes:
+            self._processes.shutdown(wait=wait)
@@ -0,0 +1,250 @@
+import bisect
+import csv
+import functools
+import os
+import re
+import threading
+import unicodedata
+
+from dispatch import SpatialGrid
+
+# Hubs most trips start or end at. Their distance matrices are precomputed at start-up and the
+# benchmarks draw from them; any place in the gazetteer below can be used as a point.
+LOCATIONS = [
+    ('Kampala', (0.3476, 32.5825)),
+    ('Entebbe', (0.3163, 32.3892)),
+    ('Jinja', (0.4244, 33.2041)),
+    ('Gulu', (2.7746, 32.2990)),
+    ('Mbarara', (-0.6072, 30.6545)),
+    ('Fort Portal', (0.6710, 30.2750)),
+    ('Arua', (3.0201, 30.9111)),
+    ('Mbale', (1.0784, 34.1750))
+]
+
+DEFAULT_GAZETTEER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'uganda_places.csv')
+
+# Lower ranks come first in autocomplete results
+KIND_RANKS = {'city': 0, 'town': 1, 'landmark': 2}
+
+
+def normalize(text):
+    # Case, accents and punctuation don't matter when matching names: "Fort-Portal" finds "Fort Portal"
+    text = unicodedata.normalize('NFKD', text.casefold())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(re.findall(r'\w+', text))
+
+
+class Place:
+    __slots__ = ('name', 'latitude', 'longitude', 'kind', 'population')
+
+    def __init__(self, name, latitude, longitude, kind='town', population=0):
+        self.name = name
+        self.latitude = latitude
+        self.longitude = longitude
+        self.kind = kind
+        self.population = population
+
+    @property
+    def point(self):
+        return (self.latitude, self.longitude)
+
+    @property
+    def rank(self):
+        return (KIND_RANKS.get(self.kind, len(KIND_RANKS)), -self.population, self.name)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'latitude': self.latitude,
+            'longitude': self.longitude,
+            'kind': self.kind,
+        }
+
+    def __repr__(self):
+        return f"Place({self.name!r}, {self.latitude}, {self.longitude}, {self.kind!r})"
+
+
+class PrefixTrie:
+    # Path-compressed trie: a node is [edge label, children by first character, best entries].
+    # Each node keeps its `limit` best-ranked entries, so a lookup walks down the prefix once and
+    # never searches the subtree below it.
+    def __init__(self, limit=20):
+        self.limit = limit
+        self._root = ['', {}, []]
+        self._nodes = 1
+
+    def __len__(self):
+        return self._nodes
+
+    def _offer(self, node, entry):
+        best = node[2]
+        if best and entry >= best[-1]:
+            # The usual case, since Gazetteer adds places best first: append or nothing to do
+            if len(best) < self.limit and entry != best[-1]:
+                best.append(entry)
+            return
+        if entry in best:
+            return
+        bisect.insort(best, entry)
+        if len(best) > self.limit:
+            best.pop()
+
+    def insert(self, key, rank, value):
+        entry = (rank, value)
+        node = self._root
+        self._offer(node, entry)
+        while key:
+            child = node[1].get(key[0])
+            if child is None:
+                node[1][key[0]] = [key, {}, [entry]]
+                self._nodes += 1
+                return
+            label = child[0]
+            if key.startswith(label):
+                common = len(label)
+            else:
+                common = len(os.path.commonprefix((label, key)))
+                # Split the edge; the new node starts with everything below the old child
+                middle = [label[:common], {label[common]: child}, list(child[2])]
+                child[0] = label[common:]
+                node[1][key[0]] = middle
+                self._nodes += 1
+                child = middle
+            self._offer(child, entry)
+            node = child
+            key = key[common:]
+
+    def complete(self, prefix, limit=None):
+        node = self._root
+        key = prefix
+        while key:
+            child = node[1].get(key[0])
+            if child is None:
+                return []
+            label = child[0]
+            if len(key) <= len(label):
+                if not label.startswith(key):
+                    return []
+                node = child
+                break
+            if not key.startswith(label):
+                return []
+            node = child
+            key = key[len(label):]
+        return [value for _, value in node[2][:limit or self.limit]]
+
+
+class Gazetteer:
+    # Named places with a prefix trie for autocomplete, a hash index for exact names and a
+    # spatial grid for turning coordinates back into a name
+    def __init__(self, places=(), suggestions=20, reverse_cache_size=65536):
+        self._places = []
+        self._by_name = {}
+        self._trie = PrefixTrie(limit=suggestions)
+        self._grid = SpatialGrid(cell_size=0.1)
+        for place in sorted(places, key=lambda p: p.rank):
+            self.add(place)
+        # Dashboards render the same trip end points over and over
+        self.name_near = functools.lru_cache(maxsize=reverse_cache_size)(self._name_near)
+
+    def add(self, place):
+        key = normalize(place.name)
+        if not key or key in self._by_name:
+            # First one wins; places are added best-ranked first, so that is the better known of two namesakes
+            return False
+        number = len(self._places)
+        self._places.append(place)
+        self._by_name[key] = place
+        words = key.split(' ')
+        for start in range(len(words)):
+            # Every word starts a key, so "portal" finds "Fort Portal" too
+            self._trie.insert(' '.join(words[start:]), place.rank, number)
+        self._grid.insert(number, place, place.latitude, place.longitude)
+        return True
+
+    def __len__(self):
+        return len(self._places)
+
+    def __iter__(self):
+        return iter(self._places)
+
+    def __contains__(self, name):
+        return isinstance(name, str) and normalize(name) in self._by_name
+
+    def get(self, name):
+        return self._by_name.get(normalize(name)) if isinstance(name, str) else None
+
+    def coords(self, name):
+        place = self.get(name)
+        if place is None:
+            raise ValueError(f"Unknown location '{name}'")
+        return place.point
+
+    def search(self, query, limit=10):
+        key = normalize(query or '')
+        if not key:
+            return []
+        return [self._places[number] for number in self._trie.complete(key, limit)]
+
+    def _name_near(self, point, within_km=1.0):
+        nearest = self._grid.nearest(point[0], point[1], 1)
+        if nearest and nearest[0][0] <= within_km:
+            return nearest[0][2].name
+        return None
+
+    def label(self, point, within_km=1.0):
+        # A place name for coordinates on (or within a kilometre of) a known place, otherwise the coordinates
+        point = (float(point[0]), float(point[1]))
+        return self.name_near(point, within_km) or f"({point[0]:.4f}, {point[1]:.4f})"
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        if path.endswith('.txt'):
+            places = read_geonames(path)
+        else:
+            places = read_csv(path)
+        return cls(places, **kwargs)
+
+
+def read_csv(path):
+    # name,latitude,longitude[,kind[,population]] with a header row
+    with open(path, encoding='utf-8', newline='') as lines:
+        for row in csv.DictReader(lines):
+            yield Place(row['name'].strip(), float(row['latitude']), float(row['longitude']),
+                        (row.get('kind') or 'town').strip(), int(row.get('population') or 0))
+
+
+# GeoNames feature classes worth offering as pick-up points: populated places, spots and buildings,
+# parks and areas
+GEONAMES_CLASSES = {'P', 'S', 'L'}
+GEONAMES_CITY_CODES = {'PPLC', 'PPLA', 'PPLA2'}
+
+
+def read_geonames(path):
+    # A GeoNames country extract (e.g. UG.txt from download.geonames.org/export/dump)
+    with open(path, encoding='utf-8') as lines:
+        for line in lines:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) < 15 or fields[6] not in GEONAMES_CLASSES:
+                continue
+            if fields[6] != 'P':
+                kind = 'landmark'
+            elif fields[7] in GEONAMES_CITY_CODES:
+                kind = 'city'
+            else:
+                kind = 'town'
+            yield Place(fields[1], float(fields[4]), float(fields[5]), kind, int(fields[14] or 0))
+
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+def gazetteer():
+    # Loaded on first use from DRIVESYNC_GAZETTEER, or the bundled list of Ugandan places
+    global _gazetteer
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                _gazetteer = Gazetteer.load(os.environ.get('DRIVESYNC_GAZETTEER') or DEFAULT_GAZETTEER)
+    return _gazetteer
@@ -1,5 +1,10 @@
+import logging
+import uuid
 from abc import ABC, abstractmethod
-from geopy.distance import geodesic
+from datetime import datetime
+import metrics
+
+logger = logging.getLogger(__name__)
 
 class Account(ABC):
     def __init__(self, account_id, name, email, contact):
@@ -55,6 +60,9 @@ class Driver(Account):
         self._driver_day_allowance = driver_day_allowance
         self._driver_night_allowance = driver_night_allowance
         self._vehicle = None
+        # Last reported (latitude, longitude); None until the driver checks in
+        self.position = None
+        self.available = True
 
     @property
     def vehicle(self):
@@ -110,7 +118,7 @@ class Client(Account):
         return "Client"
 
 class ClientRequest:
-    def __init__(self, name, email, contact, goods_description, pick_up_point, drop_off_point, comments, estimated_cost=0.0, client_id=None, pick_up_name=None, drop_off_name=None):
+    def __init__(self, name, email, contact, goods_description, pick_up_point, drop_off_point, comments, estimated_cost=0.0, client_id=None, pick_up_name=None, drop_off_name=None, estimate_status='done', job_id=None, vehicle_type=None, status='pending', fuel_cost=None, record_id=None, request_id=None):
         self.name = name
         self.email = email
         self.contact = contact
@@ -122,6 +130,19 @@ class ClientRequest:
         self.client_id = client_id
         self.pick_up_name = pick_up_name
         self.drop_off_name = drop_off_name
+        self.estimate_status = estimate_status
+        self.job_id = job_id
+        self.vehicle_type = vehicle_type
+        # 'pending' until an admin closes it once it has been handled; only pending requests count
+        # against the backlog cap
+        self.status = status
+        # Same in every process, so a close made in one worker can be applied in the others
+        self.request_id = request_id or uuid.uuid4().hex
+        # Fuel price the estimate was made with, and the lazily costed Trip behind it, for repricing
+        self.fuel_cost = fuel_cost
+        self.quote_trip = None
+        # Row id once persisted, so repriced estimates can be written back
+        self.record_id = record_id
 
     def get_details(self):
         return (
@@ -132,15 +153,68 @@ class ClientRequest:
         )
 
 class Trip:
-    def __init__(self, start_location, end_location, fuel_cost, vehicle: Vehicle, driver: Driver, client_id=None):
+    def __init__(self, start_location, end_location, fuel_cost, vehicle: Vehicle, driver: Driver, client_id=None, distance_service=None, created_at=None, starts_at=None, ends_at=None):
+        # Distance and cost are worked out on first use and cached; the setters below drop
+        # whichever cached value depends on what changed
+        self._distance = None
+        self._total_cost = None
         self.start_location = start_location
         self.end_location = end_location
         self.fuel_cost = fuel_cost
         self.vehicle = vehicle
         self.driver = driver
         self.client_id = client_id
-        self._distance = self.calculate_distance()
-        self._total_cost = self.calculate_cost()
+        self.distance_service = distance_service
+        self.created_at = created_at or datetime.now()
+        # When the driver and vehicle are committed; None for an unscheduled trip. Without an
+        # explicit end, the trip is taken to last as long as the drive is expected to.
+        self.starts_at = starts_at
+        self._ends_at = ends_at
+
+    @property
+    def start_location(self):
+        return self._start_location
+
+    @start_location.setter
+    def start_location(self, value):
+        self._start_location = value
+        self._distance = self._total_cost = None
+
+    @property
+    def end_location(self):
+        return self._end_location
+
+    @end_location.setter
+    def end_location(self, value):
+        self._end_location = value
+        self._distance = self._total_cost = None
+
+    @property
+    def fuel_cost(self):
+        return self._fuel_cost
+
+    @fuel_cost.setter
+    def fuel_cost(self, value):
+        self._fuel_cost = value
+        self._total_cost = None
+
+    @property
+    def vehicle(self):
+        return self._vehicle
+
+    @vehicle.setter
+    def vehicle(self, value):
+        self._vehicle = value
+        self._total_cost = None
+
+    @property
+    def driver(self):
+        return self._driver
+
+    @driver.setter
+    def driver(self, value):
+        self._driver = value
+        self._total_cost = None
 
     def calculate_distance(self):
         try:
@@ -148,16 +222,22 @@ class Trip:
                 raise ValueError("Locations must be tuples of (latitude, longitude)")
             if not all(isinstance(coord, (int, float)) for coord in self.start_location + self.end_location):
                 raise ValueError("Coordinates must be numeric")
-            distance = geodesic(self.start_location, self.end_location).km
+            if self.distance_service is not None:
+                distance = self.distance_service.distance(self.start_location, self.end_location)
+            else:
+                metrics.GEODESIC_CALLS.inc()
+                from geopy.distance import geodesic
+                distance = geodesic(self.start_location, self.end_location).km
             if distance < 0:
                 raise ValueError("Calculated distance is negative")
             return distance
         except Exception as e:
-            print(f"❌ Error calculating distance: {e}")
+            metrics.DISTANCE_ERRORS.inc()
+            logger.warning("Error calculating distance: %s", e)
             return 0
 
     def calculate_cost(self):
-        fuel_expense = self._distance * self.vehicle.fuel_litres_per_km * self.fuel_cost
+        fuel_expense = self.distance * self.vehicle.fuel_litres_per_km * self.fuel_cost
         total = (
             fuel_expense +
             self.driver.driver_day_allowance +
@@ -166,10 +246,25 @@ class Trip:
         )
         return total
 
+    @property
+    def driver_id(self):
+        return self.driver.account_id if self.driver else None
+
+    @property
+    def ends_at(self):
+        if self._ends_at is None and self.starts_at is not None:
+            from scheduling import estimated_duration
+            self._ends_at = self.starts_at + estimated_duration(self.distance)
+        return self._ends_at
+
     @property
     def distance(self):
+        if self._distance is None:
+            self._distance = self.calculate_distance()
         return self._distance
 
     @property
     def total_cost(self):
+        if self._total_cost is None:
+            self._total_cost = self.calculate_cost()
         return self._total_cost
\ No newline at end of file
@@ -0,0 +1,97 @@
+import base64
+import heapq
+import json
+from operator import itemgetter
+
+
+class ChainedSequence:
+    # Read-only concatenation that indexes into its parts instead of copying them
+    def __init__(self, *parts):
+        self.parts = parts
+
+    def __len__(self):
+        return sum(len(part) for part in self.parts)
+
+    def __getitem__(self, position):
+        for part in self.parts:
+            if position < len(part):
+                return part[position]
+            position -= len(part)
+        raise IndexError(position)
+
+
+class Page:
+    def __init__(self, items, next_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+
+def encode_cursor(value, position):
+    raw = json.dumps([value, position], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    if not token:
+        return None
+    try:
+        value, position = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        return (value, int(position))
+    except (ValueError, TypeError):
+        return None
+
+
+def paginate(sequence, limit, after=None, sort_key=None, descending=False, predicate=None):
+    # Keyset pagination: the cursor is the (sort value, position) of the last row served,
+    # so each page only touches the rows after it instead of counting an offset from the top
+    cursor = decode_cursor(after)
+    if sort_key is None:
+        return _paginate_by_position(sequence, limit, cursor, descending, predicate)
+
+    def candidates():
+        for position in range(len(sequence)):
+            item = sequence[position]
+            if predicate and not predicate(item):
+                continue
+            key = (sort_key(item), position)
+            if cursor and (key >= cursor if descending else key <= cursor):
+                continue
+            yield key, item
+
+    select = heapq.nlargest if descending else heapq.nsmallest
+    try:
+        picked = select(limit + 1, candidates(), key=itemgetter(0))
+    except TypeError:
+        # Cursor from a different sort order; start again from the first page
+        cursor = None
+        picked = select(limit + 1, candidates(), key=itemgetter(0))
+    next_cursor = encode_cursor(*picked[limit - 1][0]) if len(picked) > limit else None
+    return Page([item for _, item in picked[:limit]], next_cursor)
+
+
+def _paginate_by_position(sequence, limit, cursor, descending, predicate):
+    if descending:
+        start = cursor[1] - 1 if cursor else len(sequence) - 1
+        positions = range(min(start, len(sequence) - 1), -1, -1)
+    else:
+        positions = range(cursor[1] + 1 if cursor else 0, len(sequence))
+    items = []
+    last_position = None
+    for position in positions:
+        item = sequence[position]
+        if predicate and not predicate(item):
+            continue
+        if len(items) == limit:
+            return Page(items, encode_cursor(None, last_position))
+        items.append(item)
+        last_position = position
+    return Page(items)
@@ -0,0 +1,188 @@
+from collections import defaultdict
+
+import numpy as np
+
+import batch
+from dispatch import COMPATIBLE_VEHICLE_TYPES
+
+
+class Route:
+    def __init__(self, pick_up_point, requests, distance, cost, separate_cost, driver=None, vehicle=None):
+        self.pick_up_point = pick_up_point
+        self.requests = requests
+        self.distance = distance
+        self.cost = cost
+        self.separate_cost = separate_cost
+        self.driver = driver
+        self.vehicle = vehicle
+
+    @property
+    def savings(self):
+        return self.separate_cost - self.cost
+
+    def to_dict(self):
+        first = self.requests[0]
+        return {
+            'pick_up': first.pick_up_name or list(self.pick_up_point),
+            'stops': [{'client_id': r.client_id, 'drop_off': r.drop_off_name or list(r.drop_off_point)}
+                      for r in self.requests],
+            'distance_km': round(self.distance, 3),
+            'cost': round(self.cost, 2),
+            'separate_cost': round(self.separate_cost, 2),
+            'savings': round(self.savings, 2),
+            'driver_id': self.driver.account_id if self.driver else None,
+            'vehicle_reg_no': self.vehicle.vehicle_reg_no if self.vehicle else None,
+        }
+
+
+class Plan:
+    def __init__(self, routes):
+        self.routes = routes
+
+    @property
+    def total_cost(self):
+        return sum(route.cost for route in self.routes)
+
+    @property
+    def separate_cost(self):
+        return sum(route.separate_cost for route in self.routes)
+
+    @property
+    def savings(self):
+        return self.separate_cost - self.total_cost
+
+    def to_dict(self):
+        return {
+            'requests': sum(len(route.requests) for route in self.routes),
+            'routes': [route.to_dict() for route in self.routes],
+            'total_cost': round(self.total_cost, 2),
+            'separate_cost': round(self.separate_cost, 2),
+            'savings': round(self.savings, 2),
+        }
+
+
+def distance_matrix(points):
+    # One vectorised row per point, so memory stays O(n) per step rather than O(n^2) temporaries
+    coords = np.asarray(points, dtype=float).reshape(-1, 2)
+    matrix = np.empty((len(coords), len(coords)))
+    for row, point in enumerate(coords):
+        matrix[row] = batch.geodesic_km(np.broadcast_to(point, coords.shape), coords)
+    np.fill_diagonal(matrix, 0.0)
+    return matrix
+
+
+class ConsolidationPlanner:
+    # Groups requests that share a pick-up point (and vehicle type) into open multi-stop routes with
+    # the Clarke-Wright savings heuristic: every route starts as pick-up -> one drop-off, then route
+    # ends are joined in order of the distance saved while the stop and length limits allow.
+    # Routes are then handed to available drivers, longest first, cheapest fleet member each time.
+    def __init__(self, fuel_cost, default_vehicle, default_driver, max_stops=6, max_route_km=600):
+        self.fuel_cost = fuel_cost
+        self.default_vehicle = default_vehicle
+        self.default_driver = default_driver
+        self.max_stops = max_stops
+        self.max_route_km = max_route_km
+
+    def fixed_cost(self, vehicle, driver):
+        return driver.driver_day_allowance + driver.driver_night_allowance + vehicle.daily_vehicle_charges
+
+    def route_cost(self, distance, vehicle, driver):
+        return distance * vehicle.fuel_litres_per_km * self.fuel_cost + self.fixed_cost(vehicle, driver)
+
+    def plan(self, requests, drivers=()):
+        if not requests:
+            return Plan([])
+        points = []
+        positions = {}
+        for request in requests:
+            for point in (request.pick_up_point, request.drop_off_point):
+                key = tuple(point)
+                if key not in positions:
+                    positions[key] = len(points)
+                    points.append(key)
+        matrix = distance_matrix(points)
+
+        groups = defaultdict(list)
+        for request in requests:
+            groups[(tuple(request.pick_up_point), request.vehicle_type)].append(request)
+
+        min_saving_km = self._break_even_km()
+        sequences = []
+        for (pick_up, vehicle_type), members in groups.items():
+            depot = positions[pick_up]
+            stops = [positions[tuple(r.drop_off_point)] for r in members]
+            for order in self._savings(matrix, depot, stops, min_saving_km):
+                sequences.append((pick_up, vehicle_type, [members[i] for i in order],
+                                  [stops[i] for i in order], depot))
+        return Plan(self._assign(sequences, matrix, drivers))
+
+    def _break_even_km(self):
+        # A join still pays off while its extra driving costs less than the fixed charges it saves
+        rate = self.default_vehicle.fuel_litres_per_km * self.fuel_cost
+        fixed = self.fixed_cost(self.default_vehicle, self.default_driver)
+        return -fixed / rate if rate > 0 else -np.inf
+
+    def _savings(self, matrix, depot, stops, min_saving_km):
+        count = len(stops)
+        if count == 1:
+            return [[0]]
+        stops = np.asarray(stops)
+        from_depot = matrix[depot, stops]
+        between = matrix[np.ix_(stops, stops)]
+        # Joining a route ending at i to one starting at j replaces depot -> j with i -> j
+        saving = from_depot[np.newaxis, :] - between
+        saving[np.diag_indices(count)] = -np.inf
+        order = np.argsort(saving, axis=None, kind='stable')[::-1]
+        limit = int(np.count_nonzero(saving > min_saving_km))
+
+        routes = {i: [i] for i in range(count)}
+        lengths = {i: float(from_depot[i]) for i in range(count)}
+        route_of = list(range(count))
+        head = [True] * count
+        tail = [True] * count
+        for flat in order[:limit].tolist():
+            i, j = divmod(flat, count)
+            if not (tail[i] and head[j]):
+                continue
+            left, right = route_of[i], route_of[j]
+            if left == right or len(routes[left]) + len(routes[right]) > self.max_stops:
+                continue
+            length = lengths[left] + lengths[right] - from_depot[j] + between[i, j]
+            if length > self.max_route_km:
+                continue
+            tail[i] = head[j] = False
+            for member in routes[right]:
+                route_of[member] = left
+            routes[left].extend(routes.pop(right))
+            lengths[left] = float(length)
+            del lengths[right]
+        return list(routes.values())
+
+    def _assign(self, sequences, matrix, drivers):
+        fleet = [d for d in drivers if d.available and d.vehicle]
+        measured = []
+        for pick_up, vehicle_type, members, stops, depot in sequences:
+            path = [depot] + stops
+            distance = float(sum(matrix[a, b] for a, b in zip(path, path[1:])))
+            singles = [float(matrix[depot, stop]) for stop in stops]
+            measured.append((distance, pick_up, vehicle_type, members, singles))
+        measured.sort(key=lambda item: item[0], reverse=True)
+
+        routes = []
+        for distance, pick_up, vehicle_type, members, singles in measured:
+            allowed = COMPATIBLE_VEHICLE_TYPES.get(vehicle_type) if vehicle_type else None
+            candidates = [d for d in fleet if allowed is None or d.vehicle.vehicle_type in allowed]
+            driver = min(candidates, key=lambda d: self.route_cost(distance, d.vehicle, d), default=None)
+            if driver is not None:
+                fleet.remove(driver)
+                vehicle = driver.vehicle
+            else:
+                vehicle = None
+            cost_vehicle, cost_driver = (vehicle, driver) if driver else (self.default_vehicle, self.default_driver)
+            routes.append(Route(
+                pick_up, members, distance,
+                cost=self.route_cost(distance, cost_vehicle, cost_driver),
+                separate_cost=sum(self.route_cost(single, cost_vehicle, cost_driver) for single in singles),
+                driver=driver, vehicle=vehicle
+            ))
+        return routes
@@ -0,0 +1,107 @@
+import threading
+from collections import defaultdict
+from operator import attrgetter
+
+
+class DuplicateRecordError(ValueError):
+    pass
+
+
+class Snapshot:
+    # Fixed-length view of an append-only sequence: rows added after it was taken are not seen,
+    # and taking one copies nothing, so readers never wait for or block writers
+    def __init__(self, items, length):
+        self._items = items
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self._items[p] for p in range(*position.indices(self._length))]
+        if position < 0:
+            position += self._length
+        if not 0 <= position < self._length:
+            raise IndexError(position)
+        return self._items[position]
+
+    def __iter__(self):
+        for position in range(self._length):
+            yield self._items[position]
+
+
+class IdAllocator:
+    # Hands out prefix + zero-padded number ids under a lock; ids for which exists() is true,
+    # such as ones loaded from another worker process, are skipped
+    def __init__(self, prefix, width=3, exists=None):
+        self.prefix = prefix
+        self.width = width
+        self.exists = exists
+        self._next = 1
+        self._lock = threading.Lock()
+
+    def allocate(self):
+        with self._lock:
+            while True:
+                candidate = f"{self.prefix}{self._next:0{self.width}d}"
+                self._next += 1
+                if not (self.exists and self.exists(candidate)):
+                    return candidate
+
+
+class IndexedCollection:
+    # Append-only. Writers serialise on a per-collection lock; lookups and snapshot() never take it.
+    def __init__(self, unique=(), multi=()):
+        self._items = []
+        self._unique = {name: ({}, attrgetter(name)) for name in unique}
+        self._multi = {name: (defaultdict(list), attrgetter(name)) for name in multi}
+        self._lock = threading.Lock()
+
+    def check(self, item):
+        for name, (index, key) in self._unique.items():
+            value = key(item)
+            if value is not None and value in index:
+                raise DuplicateRecordError(f"{name} '{value}' already exists")
+
+    def add(self, item):
+        # Check every unique key before touching any index so a rejected item leaves no trace
+        with self._lock:
+            self.check(item)
+            for index, key in self._unique.values():
+                value = key(item)
+                if value is not None:
+                    index[value] = item
+            for index, key in self._multi.values():
+                index[key(item)].append(item)
+            # Appended last, so an item is findable by key before iteration or a snapshot can reach it
+            self._items.append(item)
+        return item
+
+    def snapshot(self):
+        return Snapshot(self._items, len(self._items))
+
+    def get(self, name, value, default=None):
+        return self._unique[name][0].get(value, default)
+
+    def find(self, name, value):
+        index = self._multi[name][0]
+        return list(index[value]) if value in index else []
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, position):
+        return self._items[position]
+
+    def __bool__(self):
+        return bool(self._items)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self._items!r})"
@@ -0,0 +1,193 @@
+import random
+import threading
+from collections import defaultdict
+from datetime import timedelta
+
+# Used to estimate when a trip ends if only its start is given
+AVERAGE_SPEED_KMH = 45
+# Loading and unloading: no trip blocks a driver or vehicle for less than this
+MIN_TRIP_DURATION = timedelta(hours=1)
+
+
+def estimated_duration(distance_km):
+    return max(timedelta(hours=distance_km / AVERAGE_SPEED_KMH), MIN_TRIP_DURATION)
+
+
+def local_time(value):
+    # Bookings are kept in naive local time; times with an offset are converted so the two compare
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+
+class _Node:
+    __slots__ = ('start', 'end', 'value', 'priority', 'left', 'right', 'max_end')
+
+    def __init__(self, start, end, value, priority):
+        self.start = start
+        self.end = end
+        self.value = value
+        self.priority = priority
+        self.left = None
+        self.right = None
+        self.max_end = end
+
+
+def _fix(node):
+    max_end = node.end
+    if node.left is not None and node.left.max_end > max_end:
+        max_end = node.left.max_end
+    if node.right is not None and node.right.max_end > max_end:
+        max_end = node.right.max_end
+    node.max_end = max_end
+
+
+class IntervalTree:
+    # Half-open [start, end) intervals in a treap ordered by start, each node carrying the latest
+    # end below it. The random priorities keep it balanced in expectation whatever order bookings
+    # arrive in, so an overlap query is O(log n + k) for k results.
+    def __init__(self, seed=None):
+        self._root = None
+        self._length = 0
+        self._random = random.Random(seed)
+
+    def __len__(self):
+        return self._length
+
+    def insert(self, start, end, value):
+        self._root = self._insert(self._root, _Node(start, end, value, self._random.random()))
+        self._length += 1
+
+    def _insert(self, node, new):
+        if node is None:
+            return new
+        if new.start < node.start:
+            node.left = self._insert(node.left, new)
+            if node.left.priority > node.priority:
+                return self._rotate_right(node)
+        else:
+            node.right = self._insert(node.right, new)
+            if node.right.priority > node.priority:
+                return self._rotate_left(node)
+        if new.end > node.max_end:
+            node.max_end = new.end
+        return node
+
+    def _rotate_right(self, node):
+        top = node.left
+        node.left = top.right
+        top.right = node
+        _fix(node)
+        _fix(top)
+        return top
+
+    def _rotate_left(self, node):
+        top = node.right
+        node.right = top.left
+        top.left = node
+        _fix(node)
+        _fix(top)
+        return top
+
+    def overlapping(self, start, end):
+        # (start, end, value) for every interval overlapping [start, end), earliest first
+        found = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            # Nothing below ends after start
+            if node is None or node.max_end <= start:
+                continue
+            stack.append(node.left)
+            # Everything to the right starts at or after this node, so is past end too
+            if node.start < end:
+                if node.end > start:
+                    found.append((node.start, node.end, node.value))
+                stack.append(node.right)
+        found.sort(key=lambda interval: interval[:2])
+        return found
+
+    def __iter__(self):
+        stack, node = [], self._root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield (node.start, node.end, node.value)
+            node = node.right
+
+
+class BookingCalendar:
+    # One interval tree per resource (a driver or a vehicle) for conflict checks and utilisation,
+    # and one over every booking so "who is busy between T1 and T2" is a single query. Times are
+    # plain numbers (timestamps); values are whatever the caller books, e.g. a trip.
+    def __init__(self):
+        self._trees = defaultdict(IntervalTree)
+        self._all = IntervalTree()
+        # Rotations rewire nodes in place, so readers take the lock as well
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._all)
+
+    def add(self, resource, start, end, value):
+        # Does not check for conflicts: callers that must not double-book check first, under their own lock
+        with self._lock:
+            self._trees[resource].insert(start, end, value)
+            self._all.insert(start, end, (resource, value))
+
+    def bookings(self, resource, start, end):
+        # (start, end, value) of the resource's bookings overlapping [start, end), earliest first
+        with self._lock:
+            tree = self._trees.get(resource)
+            return tree.overlapping(start, end) if tree is not None else []
+
+    def busy(self, start, end):
+        with self._lock:
+            return {resource for _, _, (resource, _) in self._all.overlapping(start, end)}
+
+    def booked_time(self, resource, start, end):
+        # Time booked within [start, end) and the number of bookings touching it. Bookings are
+        # merged first, so overlapping ones (say, rows written before conflicts were checked) count once.
+        total, count, covered = 0, 0, start
+        for booking_start, booking_end, _ in self.bookings(resource, start, end):
+            count += 1
+            booking_start = max(booking_start, covered)
+            booking_end = min(booking_end, end)
+            if booking_end > booking_start:
+                total += booking_end - booking_start
+                covered = booking_end
+        return total, count
+
+    def booked_times(self, start, end):
+        # booked_time for every resource with a booking in [start, end), in one in-order walk of the
+        # combined tree: {resource: (time booked, bookings)}. Bookings are totalled as the walk
+        # reaches them, earliest first, instead of being collected and sorted as overlapping() does.
+        booked = {}
+        with self._lock:
+            stack, node = [], self._all._root
+            while stack or node is not None:
+                # Only go left while something down there ends after start
+                while node is not None and node.max_end > start:
+                    stack.append(node)
+                    node = node.left
+                if not stack:
+                    break
+                node = stack.pop()
+                if node.start >= end:
+                    break
+                if node.end > start:
+                    resource = node.value[0]
+                    entry = booked.get(resource)
+                    if entry is None:
+                        # [time booked, bookings, end of the time counted so far]
+                        entry = booked[resource] = [0, 0, start]
+                    entry[1] += 1
+                    booking_start = node.start if node.start > entry[2] else entry[2]
+                    booking_end = node.end if node.end < end else end
+                    if booking_end > booking_start:
+                        entry[0] += booking_end - booking_start
+                        entry[2] = booking_end
+                node = node.right
+        return {resource: (total, count) for resource, (total, count, _) in booked.items()}
@@ -0,0 +1,64 @@
+import threading
+from collections import defaultdict
+
+
+class Aggregate:
+    __slots__ = ('trip_count', 'total_distance', 'total_cost', 'last_trip_at')
+
+    def __init__(self):
+        self.trip_count = 0
+        self.total_distance = 0.0
+        self.total_cost = 0.0
+        self.last_trip_at = None
+
+    def add(self, distance, cost, at):
+        self.trip_count += 1
+        self.total_distance += distance
+        self.total_cost += cost
+        if self.last_trip_at is None or at > self.last_trip_at:
+            self.last_trip_at = at
+
+    def to_dict(self):
+        return {
+            'trip_count': self.trip_count,
+            'total_distance': round(self.total_distance, 3),
+            'total_cost': round(self.total_cost, 2),
+            'average_cost': round(self.total_cost / self.trip_count, 2) if self.trip_count else 0.0,
+            'last_trip_at': self.last_trip_at.isoformat() if self.last_trip_at else None,
+        }
+
+
+class TripAggregates:
+    # Running totals updated once per trip write, so summaries never rescan the trip list
+    KINDS = ('clients', 'drivers', 'vehicles')
+
+    def __init__(self):
+        self.overall = Aggregate()
+        self.clients = defaultdict(Aggregate)
+        self.drivers = defaultdict(Aggregate)
+        self.vehicles = defaultdict(Aggregate)
+        self.daily = defaultdict(Aggregate)
+        self._lock = threading.Lock()
+
+    def record(self, trip):
+        distance, cost, at = trip.distance, trip.total_cost, trip.created_at
+        with self._lock:
+            self.overall.add(distance, cost, at)
+            self.daily[at.date().isoformat()].add(distance, cost, at)
+            if trip.client_id is not None:
+                self.clients[trip.client_id].add(distance, cost, at)
+            if trip.driver_id is not None:
+                self.drivers[trip.driver_id].add(distance, cost, at)
+            if trip.vehicle is not None:
+                self.vehicles[trip.vehicle.vehicle_reg_no].add(distance, cost, at)
+
+    def summary(self, kind, key):
+        # .get rather than [] so looking up an unknown id doesn't create an empty bucket
+        aggregate = getattr(self, kind).get(key)
+        return aggregate.to_dict() if aggregate else Aggregate().to_dict()
+
+    def daily_summary(self, days=None):
+        dates = sorted(self.daily)
+        if days:
+            dates = dates[-days:]
+        return {date: self.daily[date].to_dict() for date in dates}
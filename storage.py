@@ -0,0 +1,427 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager, nullcontext
+from registry import DuplicateRecordError
+
+class BookingConflict(Exception):
+    # Another process booked the driver or vehicle first; row is the conflicting trips row
+    def __init__(self, row):
+        super(BookingConflict, self).__init__(
+            f"Driver {row['driver_id']} or vehicle {row['vehicle_reg_no']} is already booked "
+            f"from {row['starts_at']} to {row['ends_at']}")
+        self.row = row
+
+
+TABLES = ('vehicles', 'drivers', 'clients', 'trips', 'client_requests', 'fuel_prices')
+
+
+class MemoryStorage:
+    # Default backend: state lives only in the DriveSyncApp indexes, nothing is persisted
+
+    def save_vehicle(self, vehicle):
+        pass
+
+    def save_driver(self, driver):
+        pass
+
+    def save_client(self, client):
+        pass
+
+    def save_trip(self, trip):
+        pass
+
+    def save_client_request(self, request):
+        pass
+
+    def update_client_request_estimates(self, requests):
+        pass
+
+    def close_client_requests(self, requests):
+        pass
+
+    def save_fuel_price(self, price, vehicle_type, effective_from):
+        pass
+
+    def batch(self):
+        return nullcontext()
+
+    def has_changes(self):
+        return False
+
+    def load_new(self):
+        return dict({table: [] for table in TABLES}, closed_client_requests=[])
+
+    def close(self):
+        pass
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS vehicles (
+    id INTEGER PRIMARY KEY,
+    vehicle_reg_no TEXT NOT NULL UNIQUE,
+    vehicle_type TEXT NOT NULL,
+    fuel_litres_per_km REAL NOT NULL,
+    daily_vehicle_charges REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS drivers (
+    id INTEGER PRIMARY KEY,
+    account_id TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL UNIQUE,
+    contact TEXT NOT NULL,
+    vehicle_type TEXT,
+    vehicle_reg_no TEXT,
+    driver_day_allowance REAL NOT NULL,
+    driver_night_allowance REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_drivers_vehicle ON drivers (vehicle_reg_no);
+CREATE TABLE IF NOT EXISTS clients (
+    id INTEGER PRIMARY KEY,
+    account_id TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL UNIQUE,
+    contact TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS trips (
+    id INTEGER PRIMARY KEY,
+    client_id TEXT,
+    driver_id TEXT,
+    vehicle_reg_no TEXT,
+    start_lat REAL NOT NULL,
+    start_lon REAL NOT NULL,
+    end_lat REAL NOT NULL,
+    end_lon REAL NOT NULL,
+    fuel_cost REAL NOT NULL,
+    distance REAL NOT NULL,
+    total_cost REAL NOT NULL,
+    created_at TEXT,
+    starts_at TEXT,
+    ends_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_trips_client ON trips (client_id);
+CREATE INDEX IF NOT EXISTS idx_trips_driver ON trips (driver_id);
+CREATE INDEX IF NOT EXISTS idx_trips_vehicle ON trips (vehicle_reg_no);
+CREATE TABLE IF NOT EXISTS client_requests (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    contact TEXT NOT NULL,
+    goods_description TEXT,
+    pick_up_lat REAL NOT NULL,
+    pick_up_lon REAL NOT NULL,
+    drop_off_lat REAL NOT NULL,
+    drop_off_lon REAL NOT NULL,
+    comments TEXT,
+    estimated_cost REAL NOT NULL,
+    client_id TEXT,
+    pick_up_name TEXT,
+    drop_off_name TEXT,
+    fuel_cost REAL,
+    request_id TEXT,
+    status TEXT,
+    closed_seq INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_client_requests_email ON client_requests (email);
+CREATE INDEX IF NOT EXISTS idx_client_requests_client ON client_requests (client_id);
+CREATE TABLE IF NOT EXISTS fuel_prices (
+    id INTEGER PRIMARY KEY,
+    vehicle_type TEXT,
+    price REAL NOT NULL,
+    effective_from TEXT NOT NULL
+);
+"""
+
+# Statements are kept as module constants so sqlite3's per-connection statement cache reuses them
+INSERT_SQL = {
+    'vehicles': "INSERT INTO vehicles (vehicle_reg_no, vehicle_type, fuel_litres_per_km, daily_vehicle_charges) VALUES (?, ?, ?, ?)",
+    'drivers': (
+        "INSERT INTO drivers (account_id, name, email, contact, vehicle_type, vehicle_reg_no, "
+        "driver_day_allowance, driver_night_allowance) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+    ),
+    'clients': "INSERT INTO clients (account_id, name, email, contact) VALUES (?, ?, ?, ?)",
+    'trips': (
+        "INSERT INTO trips (client_id, driver_id, vehicle_reg_no, start_lat, start_lon, end_lat, end_lon, "
+        "fuel_cost, distance, total_cost, created_at, starts_at, ends_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    ),
+    'client_requests': (
+        "INSERT INTO client_requests (name, email, contact, goods_description, pick_up_lat, pick_up_lon, "
+        "drop_off_lat, drop_off_lon, comments, estimated_cost, client_id, pick_up_name, drop_off_name, fuel_cost, "
+        "request_id, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    ),
+    'fuel_prices': "INSERT INTO fuel_prices (vehicle_type, price, effective_from) VALUES (?, ?, ?)",
+}
+# julianday() so times with and without a UTC offset compare as instants
+TRIP_OVERLAP_SQL = (
+    "SELECT driver_id, vehicle_reg_no, starts_at, ends_at FROM trips "
+    "WHERE (driver_id = ? OR vehicle_reg_no = ?) AND starts_at IS NOT NULL "
+    "AND julianday(starts_at) < julianday(?) AND julianday(ends_at) > julianday(?) LIMIT 1"
+)
+UPDATE_ESTIMATE_SQL = "UPDATE client_requests SET estimated_cost = ?, fuel_cost = ? WHERE id = ?"
+CLOSE_REQUEST_SQL = (
+    "UPDATE client_requests SET status = ?, "
+    "closed_seq = (SELECT COALESCE(MAX(closed_seq), 0) + 1 FROM client_requests) WHERE request_id = ?"
+)
+SELECT_CLOSED_SQL = "SELECT request_id, closed_seq FROM client_requests WHERE closed_seq > ? ORDER BY closed_seq"
+# Columns added after a table was first released: (table, column, definition)
+MIGRATIONS = (
+    ('trips', 'created_at', 'TEXT'),
+    ('client_requests', 'fuel_cost', 'REAL'),
+    ('trips', 'starts_at', 'TEXT'),
+    ('trips', 'ends_at', 'TEXT'),
+    ('client_requests', 'request_id', 'TEXT'),
+    ('client_requests', 'status', 'TEXT'),
+    ('client_requests', 'closed_seq', 'INTEGER'),
+)
+# Run after MIGRATIONS, since they use migrated columns. Rows from before request_id get one here,
+# so every process sees the same id for them.
+POST_MIGRATION_SQL = (
+    "UPDATE client_requests SET request_id = lower(hex(randomblob(16))) WHERE request_id IS NULL",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_client_requests_request_id ON client_requests (request_id)",
+    "CREATE INDEX IF NOT EXISTS idx_client_requests_closed ON client_requests (closed_seq)",
+)
+
+SELECT_NEW_SQL = {table: f"SELECT * FROM {table} WHERE id > ? ORDER BY id" for table in TABLES}
+
+
+class SQLiteStorage:
+    def __init__(self, path, timeout=30.0, batch_size=500, pool_size=8):
+        self.path = path
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.pool_size = pool_size
+        # The server may start a thread per request, so connections are checked out of a bounded
+        # pool for each call rather than kept per thread. _local only holds the checked-out
+        # connection (so nested calls reuse it) and the thread's batch buffer.
+        self._local = threading.local()
+        self._idle = queue.LifoQueue()
+        self._connections = []
+        self._opened = 0
+        # PRAGMA data_version is per connection, so has_changes remembers it per connection
+        self._data_versions = {}
+        self._lock = threading.Lock()
+        # This process's write transactions queue here instead of in SQLite's busy handler, which
+        # polls with sleeps of up to 100 ms; other processes still wait out the busy timeout
+        self._write_lock = threading.Lock()
+        # Rows this process wrote itself; load_new skips them since they are already in memory
+        self._own_ids = {table: set() for table in TABLES}
+        self._cursors = {table: 0 for table in TABLES}
+        self._closed_cursor = 0
+        with self._connection() as conn, conn:
+            conn.executescript(SCHEMA)
+            for table, column, definition in MIGRATIONS:
+                columns = {row['name'] for row in conn.execute(f"PRAGMA table_info({table})")}
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            for statement in POST_MIGRATION_SQL:
+                conn.execute(statement)
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                # The slot is taken before connecting, which happens outside the lock
+                opened = self._opened < self.pool_size
+                if opened:
+                    self._opened += 1
+            if opened:
+                try:
+                    conn = self._open()
+                except BaseException:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+                with self._lock:
+                    self._connections.append(conn)
+            else:
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise sqlite3.OperationalError("No database connection free") from None
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._idle.put(conn)
+
+    @contextmanager
+    def batch(self):
+        # Buffer writes made inside the block and flush them in as few transactions as possible
+        if getattr(self._local, 'pending', None) is not None:
+            yield
+            return
+        self._local.pending = []
+        try:
+            yield
+            self._flush()
+        finally:
+            self._local.pending = None
+
+    def _write(self, table, params, record=None):
+        # record, if given, gets the new row id as record_id once the insert commits
+        pending = getattr(self._local, 'pending', None)
+        if pending is None:
+            self._execute([(table, params, record)])
+            return
+        pending.append((table, params, record))
+        if len(pending) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        pending = self._local.pending
+        if pending:
+            self._local.pending = []
+            self._execute(pending)
+
+    def _mark_own(self, inserted, own=True):
+        # Rows are marked as ours before their transaction commits, so load_new never sees them
+        # unmarked. Only the marking takes the process-wide lock: a commit can wait out the busy
+        # timeout, and every other storage call would stall behind it.
+        with self._lock:
+            for table, row_id, _ in inserted:
+                if own:
+                    self._own_ids[table].add(row_id)
+                else:
+                    self._own_ids[table].discard(row_id)
+
+    def _execute(self, rows):
+        with self._connection() as conn:
+            inserted = []
+            try:
+                with self._write_lock, conn:
+                    for table, params, record in rows:
+                        inserted.append((table, conn.execute(INSERT_SQL[table], params).lastrowid, record))
+                    self._mark_own(inserted)
+            except sqlite3.IntegrityError as e:
+                # Raised by an insert, before anything was marked
+                raise DuplicateRecordError(str(e)) from e
+            except BaseException:
+                self._mark_own(inserted, own=False)
+                raise
+        for table, row_id, record in inserted:
+            if record is not None:
+                record.record_id = row_id
+
+    def save_vehicle(self, vehicle):
+        self._write('vehicles', (
+            vehicle.vehicle_reg_no, vehicle.vehicle_type, vehicle.fuel_litres_per_km, vehicle.daily_vehicle_charges
+        ))
+
+    def save_driver(self, driver):
+        self._write('drivers', (
+            driver.account_id, driver.name, driver.email, driver.contact, driver.vehicle_type,
+            driver.vehicle.vehicle_reg_no if driver.vehicle else None,
+            driver.driver_day_allowance, driver.driver_night_allowance
+        ))
+
+    def save_client(self, client):
+        self._write('clients', (client.account_id, client.name, client.email, client.contact))
+
+    def save_trip(self, trip):
+        params = (
+            trip.client_id, trip.driver_id, trip.vehicle.vehicle_reg_no if trip.vehicle else None,
+            trip.start_location[0], trip.start_location[1], trip.end_location[0], trip.end_location[1],
+            trip.fuel_cost, trip.distance, trip.total_cost, trip.created_at.isoformat(),
+            trip.starts_at.isoformat() if trip.starts_at else None,
+            trip.ends_at.isoformat() if trip.ends_at else None
+        )
+        if trip.starts_at is None:
+            self._write('trips', params)
+        else:
+            self._book_trip(params)
+
+    def _book_trip(self, params):
+        # Scheduled trips skip the batch buffer: the overlap check and the insert share one write
+        # transaction, so two worker processes can't both book a driver or vehicle for the same time
+        driver_id, vehicle_reg_no, starts_at, ends_at = params[1], params[2], params[11], params[12]
+        with self._connection() as conn, self._write_lock:
+            conn.execute("BEGIN IMMEDIATE")
+            inserted = []
+            try:
+                row = conn.execute(TRIP_OVERLAP_SQL, (driver_id, vehicle_reg_no, ends_at, starts_at)).fetchone()
+                if row is not None:
+                    raise BookingConflict(row)
+                inserted.append(('trips', conn.execute(INSERT_SQL['trips'], params).lastrowid, None))
+                self._mark_own(inserted)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                self._mark_own(inserted, own=False)
+                raise
+
+    def save_client_request(self, request):
+        self._write('client_requests', (
+            request.name, request.email, request.contact, request.goods_description,
+            request.pick_up_point[0], request.pick_up_point[1],
+            request.drop_off_point[0], request.drop_off_point[1],
+            request.comments, request.estimated_cost, request.client_id,
+            request.pick_up_name, request.drop_off_name, request.fuel_cost, request.request_id, request.status
+        ), record=request)
+
+    def update_client_request_estimates(self, requests):
+        # Other processes keep their own copies and reprice them when they sync the fuel price change
+        params = [(r.estimated_cost, r.fuel_cost, r.record_id) for r in requests if r.record_id is not None]
+        if not params:
+            return
+        with self._connection() as conn, self._write_lock, conn:
+            conn.executemany(UPDATE_ESTIMATE_SQL, params)
+
+    def close_client_requests(self, requests):
+        # Each close gets the next closed_seq, so other processes can pick up closes since their last sync
+        params = [(r.status, r.request_id) for r in requests]
+        if not params:
+            return
+        with self._connection() as conn, self._write_lock, conn:
+            conn.executemany(CLOSE_REQUEST_SQL, params)
+
+    def save_fuel_price(self, price, vehicle_type, effective_from):
+        self._write('fuel_prices', (vehicle_type, price, effective_from.isoformat()))
+
+    def has_changes(self):
+        # data_version moves whenever another connection commits; a cheap check to run per request
+        with self._connection() as conn:
+            version = conn.execute("PRAGMA data_version").fetchone()[0]
+            changed = version != self._data_versions.get(conn)
+            self._data_versions[conn] = version
+        return changed
+
+    def load_new(self):
+        result = {}
+        with self._connection() as conn, self._lock:
+            for table in TABLES:
+                rows = conn.execute(SELECT_NEW_SQL[table], (self._cursors[table],)).fetchall()
+                if rows:
+                    self._cursors[table] = rows[-1]['id']
+                own = self._own_ids[table]
+                result[table] = [row for row in rows if row['id'] not in own]
+                own.difference_update(row['id'] for row in rows)
+            # Requests closed since the last call, including by this process; closing twice is harmless
+            rows = conn.execute(SELECT_CLOSED_SQL, (self._closed_cursor,)).fetchall()
+            if rows:
+                self._closed_cursor = rows[-1]['closed_seq']
+            result['closed_client_requests'] = [row['request_id'] for row in rows]
+        return result
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+            self._opened = 0
+            self._data_versions.clear()
+        self._idle = queue.LifoQueue()
+        self._local = threading.local()
@@ -0,0 +1,249 @@
+import math
+import mmap
+import os
+import tempfile
+import threading
+from array import array
+from datetime import datetime
+from registry import Snapshot
+
+# Column name -> array typecode. Ids are interned to ints (-1 for None).
+COLUMNS = {
+    'start_lat': 'd',
+    'start_lon': 'd',
+    'end_lat': 'd',
+    'end_lon': 'd',
+    'fuel_cost': 'd',
+    'distance': 'd',
+    'total_cost': 'd',
+    'created_at': 'd',
+    # Scheduled start and end as timestamps, NaN for unscheduled trips
+    'starts_at': 'd',
+    'ends_at': 'd',
+    'client_id': 'l',
+    'driver_id': 'l',
+    'vehicle_reg_no': 'l',
+}
+ID_COLUMNS = ('client_id', 'driver_id', 'vehicle_reg_no')
+INDEXED_COLUMNS = ('client_id', 'driver_id')
+
+
+class Interner:
+    def __init__(self):
+        self._ids = {}
+        self._values = []
+
+    def intern(self, value):
+        if value is None:
+            return -1
+        number = self._ids.get(value)
+        if number is None:
+            number = self._ids[value] = len(self._values)
+            self._values.append(value)
+        return number
+
+    def lookup(self, value):
+        return self._ids.get(value)
+
+    def value(self, number):
+        return None if number < 0 else self._values[number]
+
+
+class TripView:
+    # Read-only stand-in for a Trip, for templates and reports; holds no data of its own
+    __slots__ = ('_store', '_row')
+
+    def __init__(self, store, row):
+        self._store = store
+        self._row = row
+
+    @property
+    def start_location(self):
+        return (self._store.value('start_lat', self._row), self._store.value('start_lon', self._row))
+
+    @property
+    def end_location(self):
+        return (self._store.value('end_lat', self._row), self._store.value('end_lon', self._row))
+
+    @property
+    def fuel_cost(self):
+        return self._store.value('fuel_cost', self._row)
+
+    @property
+    def distance(self):
+        return self._store.value('distance', self._row)
+
+    @property
+    def total_cost(self):
+        return self._store.value('total_cost', self._row)
+
+    @property
+    def created_at(self):
+        return datetime.fromtimestamp(self._store.value('created_at', self._row))
+
+    @property
+    def starts_at(self):
+        return self._store.time_value('starts_at', self._row)
+
+    @property
+    def ends_at(self):
+        return self._store.time_value('ends_at', self._row)
+
+    @property
+    def client_id(self):
+        return self._store.id_value('client_id', self._row)
+
+    @property
+    def driver_id(self):
+        return self._store.id_value('driver_id', self._row)
+
+    @property
+    def vehicle_reg_no(self):
+        return self._store.id_value('vehicle_reg_no', self._row)
+
+    def __eq__(self, other):
+        return isinstance(other, TripView) and other._store is self._store and other._row == self._row
+
+    def __hash__(self):
+        return hash((id(self._store), self._row))
+
+    def __repr__(self):
+        return f"TripView(row={self._row}, client_id={self.client_id!r}, total_cost={self.total_cost!r})"
+
+
+class TripStore:
+    # Append-only, one typed array per column. With a spill_path, rows beyond spill_threshold
+    # are flushed to one file per column and read back through read-only memory maps.
+    def __init__(self, spill_path=None, spill_threshold=100000):
+        self.spill_path = spill_path
+        self.spill_threshold = spill_threshold
+        self._columns = {name: array(code) for name, code in COLUMNS.items()}
+        self._interners = {name: Interner() for name in ID_COLUMNS}
+        self._indexes = {name: {} for name in INDEXED_COLUMNS}
+        self._spilled = 0
+        self._maps = {}
+        self._mapped = {}
+        self._length = 0
+        # Readers take the spill boundary and the in-memory columns as one pair, so a spill can
+        # swap both without a lock on the read path
+        self._tail = (self._spilled, self._columns)
+        # Only appends and spills take the lock; readers see rows below _length, which is bumped last
+        self._lock = threading.Lock()
+        # spill_path is only a prefix: each store gets its own files, unlinked as soon as they are
+        # open, so worker processes sharing the setting never truncate or append to a file another
+        # one has mapped, and nothing is left behind after a crash
+        self._files = {}
+        if spill_path:
+            directory, prefix = os.path.split(spill_path)
+            for name in COLUMNS:
+                fd, path = tempfile.mkstemp(prefix=f"{prefix}.{name}.", dir=directory or None)
+                os.unlink(path)
+                self._files[name] = os.fdopen(fd, 'a+b')
+
+    def append(self, trip):
+        with self._lock:
+            return self._append(trip)
+
+    def _append(self, trip):
+        columns = self._columns
+        columns['start_lat'].append(trip.start_location[0])
+        columns['start_lon'].append(trip.start_location[1])
+        columns['end_lat'].append(trip.end_location[0])
+        columns['end_lon'].append(trip.end_location[1])
+        columns['fuel_cost'].append(trip.fuel_cost)
+        columns['distance'].append(trip.distance)
+        columns['total_cost'].append(trip.total_cost)
+        columns['created_at'].append(trip.created_at.timestamp())
+        columns['starts_at'].append(trip.starts_at.timestamp() if trip.starts_at else math.nan)
+        columns['ends_at'].append(trip.ends_at.timestamp() if trip.ends_at else math.nan)
+        vehicle_reg_no = trip.vehicle.vehicle_reg_no if trip.vehicle else None
+        for name, value in (('client_id', trip.client_id), ('driver_id', trip.driver_id), ('vehicle_reg_no', vehicle_reg_no)):
+            columns[name].append(self._interners[name].intern(value))
+        row = self._length
+        for name in INDEXED_COLUMNS:
+            key = columns[name][-1]
+            if key >= 0:
+                self._indexes[name].setdefault(key, array('l')).append(row)
+        self._length += 1
+        if self.spill_path and len(columns['distance']) >= self.spill_threshold:
+            self._spill()
+        return TripView(self, row)
+
+    def value(self, name, row):
+        spilled, columns = self._tail
+        if row < spilled:
+            return self._mapped[name][row]
+        return columns[name][row - spilled]
+
+    def id_value(self, name, row):
+        return self._interners[name].value(self.value(name, row))
+
+    def time_value(self, name, row):
+        value = self.value(name, row)
+        return None if math.isnan(value) else datetime.fromtimestamp(value)
+
+    def spill(self):
+        with self._lock:
+            self._spill()
+
+    def _spill(self):
+        if not self.spill_path or not len(self._columns['distance']):
+            return
+        # The maps are extended before the boundary moves, and the old columns are left intact for
+        # readers that still hold the previous pair
+        for name, code in COLUMNS.items():
+            handle = self._files[name]
+            self._columns[name].tofile(handle)
+            handle.flush()
+            self._remap(name, code)
+        self._spilled = self._length
+        self._columns = {name: array(code) for name, code in COLUMNS.items()}
+        self._tail = (self._spilled, self._columns)
+
+    def _remap(self, name, code):
+        # The old map is not closed here: a reader may still hold it. It is unmapped once the
+        # last reference to its view goes away.
+        new_map = mmap.mmap(self._files[name].fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps[name] = new_map
+        self._mapped[name] = memoryview(new_map).cast(code)
+
+    def find(self, name, value):
+        key = self._interners[name].lookup(value)
+        rows = self._indexes[name].get(key) if key is not None else None
+        return [TripView(self, row) for row in rows] if rows else []
+
+    def close(self):
+        for name in list(self._mapped):
+            self._mapped.pop(name).release()
+            self._maps.pop(name).close()
+        for handle in self._files.values():
+            handle.close()
+        self._files = {}
+
+    def memory_bytes(self):
+        # Heap held by the in-memory column tails and row indexes (mapped pages are not counted)
+        total = sum(column.itemsize * len(column) for column in self._columns.values())
+        total += sum(rows.itemsize * len(rows) for index in self._indexes.values() for rows in index.values())
+        return total
+
+    def snapshot(self):
+        return Snapshot(self, self._length)
+
+    def __len__(self):
+        return self._length
+
+    def __bool__(self):
+        return self._length > 0
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [TripView(self, r) for r in range(*row.indices(self._length))]
+        if row < 0:
+            row += self._length
+        if not 0 <= row < self._length:
+            raise IndexError(row)
+        return TripView(self, row)
+
+    def __iter__(self):
+        for row in range(self._length):
+            yield TripView(self, row)